@@ -1,6 +1,6 @@
 class ExtensionManager {
     constructor() {
-        this.apiBase = 'http://localhost:5000/api';
+        this.apiBase = `${window.location.origin}/api`;
         this.initialize();
     }
 
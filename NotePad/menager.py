@@ -1,128 +1,1074 @@
 import os
+import sys
 import json
+import mmap
+import stat
+import time
 import shutil
+import hashlib
+import uuid
+import socket
+import struct
+import sqlite3
+import itertools
+import bisect
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
-import requests
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+try:
+    import requests
+except ImportError:
+    # Менеджер ставит requests в собственное окружение при первом запуске, см. ensure_environment
+    requests = None
 import zipfile
-import io
 
-class ExtensionManager:
+class MappedFile:
+    """Файловый интерфейс поверх mmap для zipfile (у mmap нет seekable до Python 3.13)"""
+    def __init__(self, mapped):
+        self.mapped = mapped
+    
+    def __getattr__(self, name):
+        return getattr(self.mapped, name)
+    
+    def seekable(self):
+        return True
+
+def extract_archive(archive_path, destination, workers=None):
+    """Распаковывает zip-архив в несколько потоков
+    
+    Архив отображается в память, папки создаются заранее, файлы
+    распаковываются пулом потоков (zlib отпускает GIL). Пути, выходящие
+    за пределы destination, отклоняются целиком до начала распаковки.
+    """
+    destination = os.path.realpath(destination)
+    
+    with open(archive_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with zipfile.ZipFile(MappedFile(mapped)) as zip_ref:
+            directories = set()
+            files = []
+            for info in zip_ref.infolist():
+                target = os.path.normpath(os.path.join(destination, info.filename))
+                if target != destination and not target.startswith(destination + os.sep):
+                    raise ValueError(f"Небезопасный путь в архиве: {info.filename}")
+                
+                if info.is_dir():
+                    directories.add(target)
+                else:
+                    directories.add(os.path.dirname(target))
+                    files.append((info, target))
+            
+            for directory in sorted(directories):
+                os.makedirs(directory, exist_ok=True)
+            
+            def extract_batch(batch):
+                for info, target in batch:
+                    with zip_ref.open(info) as source, open(target, 'wb') as output:
+                        shutil.copyfileobj(source, output, 1024 * 1024)
+                    
+                    # Права доступа сохраняются только для архивов, собранных в Unix
+                    mode = (info.external_attr >> 16) & 0o777
+                    if info.create_system == 3 and mode:
+                        os.chmod(target, mode)
+            
+            # Файлы раздаются пачками: отдельная задача на каждый мелкий файл дороже самой распаковки
+            workers = workers or os.cpu_count() or 1
+            batch_count = min(len(files), workers * 4) or 1
+            batches = [files[i::batch_count] for i in range(batch_count)]
+            with ThreadPoolExecutor(workers) as pool:
+                for _ in pool.map(extract_batch, batches):
+                    pass
+
+def make_executable(extension_dir, start):
+    """Добавляет право на выполнение стартовому файлу exe-расширения
+    
+    Поле start приходит из скачанного архива, поэтому путь, который после
+    разрешения ссылок выходит за пределы extension_dir, отклоняется с ValueError.
+    """
+    root = os.path.realpath(extension_dir)
+    path = os.path.realpath(os.path.join(root, start))
+    if os.path.isabs(start) or not path.startswith(root + os.sep):
+        raise ValueError(f"Поле start выходит за пределы расширения: {start}")
+    if os.name == 'posix' and os.path.isfile(path):
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def extension_path(additions_path, name):
+    """Папка расширения name прямо внутри additions_path
+    
+    Имя приходит из rules.json скачанного архива или из адреса запроса,
+    поэтому абсолютные пути, разделители, '..' и скрытые имена (служебные
+    папки .trash, .cache и т.п.) отклоняются с ValueError.
+    """
+    separators = {'/', '\\', os.sep, os.altsep} - {None}
+    if (not isinstance(name, str) or not name.strip() or name.startswith('.') or '..' in name
+            or '\0' in name or os.path.isabs(name) or any(sep in name for sep in separators)):
+        raise ValueError(f"Недопустимое имя расширения: {name!r}")
+    
+    root = os.path.realpath(additions_path)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"Расширение {name!r} выходит за пределы папки additions")
+    return path
+
+# Стандартная библиотека компилируется один раз на интерпретатор и не сверяется по хешу:
+# она меняется только при обновлении python, а проверка по времени изменения это заметит
+STDLIB_COMPILE = (
+    "import re, sys, sysconfig, compileall\n"
+    "skip = re.compile(r'[/\\\\](test|tests|idlelib|lib2to3|turtledemo|site-packages|dist-packages)[/\\\\]')\n"
+    "paths = {sysconfig.get_path('stdlib'), sysconfig.get_path('platstdlib')}\n"
+    "sys.exit(not all([compileall.compile_dir(p, quiet=2, workers=0, rx=skip) for p in paths]))\n"
+)
+
+def extension_python(extension_dir):
+    """Интерпретатор, которым браузер запускает python-расширение
+    
+    Должен совпадать с Browser.extension_python в main.py: байткод другой
+    версии python лежит под другим тегом кэша и при запуске не используется.
+    """
+    python = DependencyInstaller.venv_python(os.path.join(extension_dir, '.venv'))
+    if os.path.exists(python):
+        return python
+    return shutil.which('python') or sys.executable
+
+def pycache_mirror(pycache_root, path):
+    """Папка внутри PYTHONPYCACHEPREFIX, куда python кладет байткод файлов из path
+    
+    Префикс повторяет абсолютные пути исходников (без буквы диска), поэтому
+    один общий префикс подходит всем расширениям и интерпретаторам.
+    """
+    return os.path.join(pycache_root, os.path.splitdrive(os.path.abspath(path))[1].lstrip('/\\'))
+
+def compile_bytecode(extension_dir, pycache_root):
+    """Заранее компилирует python-расширение в общий PYTHONPYCACHEPREFIX
+    
+    Компилируются файлы расширения вместе с его .venv (pip пишет байткод в
+    __pycache__, а при заданном префиксе python эти папки не читает) и
+    стандартная библиотека интерпретатора, которым браузер запустит
+    расширение. Файлы расширения компилируются как unchecked-hash и не
+    сверяются с исходниками, поэтому при переустановке их папку внутри
+    префикса нужно очищать.
+    """
+    python = extension_python(extension_dir)
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_root)
+    
+    ok = True
+    for command in ([python, '-c', STDLIB_COMPILE],
+                    [python, '-m', 'compileall', '-q', '-j', '0',
+                     '--invalidation-mode', 'unchecked-hash', extension_dir]):
+        result = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if result.returncode != 0:
+            # Файлы с ошибками скомпилируются при импорте, как раньше
+            print(f"Не все файлы скомпилированы: {result.stdout.strip()}")
+            ok = False
+    return ok
+
+class DependencyInstaller:
+    """Виртуальные окружения python-расширений из общего локального кэша колес
+    
+    Зависимости берутся из поля dependencies в rules.json и ставятся в
+    папку .venv расширения только из additions/.wheels (--no-index), поэтому
+    установка работает без сети. В сеть pip обращается, только если нужного
+    колеса нет в кэше. Одинаковые файлы разных окружений заменяются
+    жесткими ссылками на общее хранилище.
+    """
+    def __init__(self, additions_path):
+        self.wheelhouse = os.path.join(additions_path, '.wheels')
+        self.store_path = os.path.join(self.wheelhouse, '.store')
+        os.makedirs(self.store_path, exist_ok=True)
+    
+    @staticmethod
+    def venv_python(venv_path):
+        if os.name == 'nt':
+            return os.path.join(venv_path, 'Scripts', 'python.exe')
+        return os.path.join(venv_path, 'bin', 'python')
+    
+    @staticmethod
+    def run(command):
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        return result.returncode == 0, result.stdout
+    
+    def install(self, extension_dir, dependencies):
+        """Создает .venv расширения и ставит в него зависимости"""
+        venv_path = os.path.join(extension_dir, '.venv')
+        ok, output = self.run([sys.executable, '-m', 'venv', venv_path])
+        if not ok:
+            raise RuntimeError(f"не удалось создать окружение: {output}")
+        python = self.venv_python(venv_path)
+        install = [python, '-m', 'pip', 'install', '--quiet', '--no-index',
+                   '--find-links', self.wheelhouse, *dependencies]
+        
+        ok, output = self.run(install)
+        if not ok:
+            # В кэше чего-то нет - один раз пополняем его из сети, без повторов и долгих ожиданий
+            self.run([python, '-m', 'pip', 'wheel', '--quiet', '--retries', '0', '--timeout', '5',
+                      '--wheel-dir', self.wheelhouse, '--find-links', self.wheelhouse, *dependencies])
+            ok, output = self.run(install)
+        if not ok:
+            raise RuntimeError(f"не удалось установить зависимости: {output}")
+        
+        return self.deduplicate(venv_path)
+    
+    def deduplicate(self, venv_path):
+        """Заменяет файлы окружения жесткими ссылками на одинаковые файлы хранилища"""
+        linked = 0
+        for root, dirs, files in os.walk(venv_path):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if os.path.islink(path) or filename.endswith('.pyc'):
+                    continue
+                
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                sha256 = digest.hexdigest()
+                stored = os.path.join(self.store_path, sha256[:2], sha256)
+                
+                try:
+                    if not os.path.exists(stored):
+                        os.makedirs(os.path.dirname(stored), exist_ok=True)
+                        os.link(path, stored)
+                    elif not os.path.samefile(path, stored):
+                        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                        os.link(stored, tmp_path)
+                        shutil.copymode(path, tmp_path)
+                        os.replace(tmp_path, path)
+                        linked += 1
+                except OSError:
+                    # Другая файловая система или нет поддержки ссылок - оставляем копию
+                    return linked
+        return linked
+    
+    def import_directory(self, path):
+        """Копирует колеса из заранее подготовленной папки в общий кэш"""
+        imported = 0
+        for filename in os.listdir(path):
+            if filename.endswith(('.whl', '.tar.gz', '.zip')) and not os.path.exists(os.path.join(self.wheelhouse, filename)):
+                shutil.copy2(os.path.join(path, filename), self.wheelhouse)
+                imported += 1
+        return imported
+
+class ExtensionRegistry:
+    """Реестр установленных расширений в SQLite (WAL) с кэшем полей rules.json
+    
+    Браузер читает список расширений прямо из registry.db, поэтому запись
+    держит блокировку только на время изменения строк. additions_list.json
+    переносится в реестр один раз и больше не обновляется.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS extensions (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            based_on TEXT NOT NULL DEFAULT '',
+            version TEXT NOT NULL DEFAULT '',
+            description TEXT NOT NULL DEFAULT '',
+            rules TEXT NOT NULL DEFAULT '{}',
+            installed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS extensions_based_on ON extensions(based_on);
+        CREATE INDEX IF NOT EXISTS extensions_version ON extensions(version);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+    
     def __init__(self, additions_path):
         self.additions_path = additions_path
+        self.db_path = os.path.join(additions_path, 'registry.db')
         self.additions_list_path = os.path.join(additions_path, 'additions_list.json')
-        self.server = None
-        self.server_thread = None
+        self.local = threading.local()
+        
+        with self.transaction() as conn:
+            for statement in self.SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            self.migrate_additions_list(conn)
+    
+    def connect(self):
+        """Возвращает соединение текущего потока"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """Транзакция записи: BEGIN IMMEDIATE сразу берет блокировку записи"""
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def migrate_additions_list(self, conn):
+        """Однократно переносит записи из additions_list.json в реестр"""
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_additions_list'").fetchone():
+            return
         
-    def load_additions_list(self):
-        """Загружает список расширений"""
         if os.path.exists(self.additions_list_path):
             with open(self.additions_list_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+                additions_list = json.load(f)
+            
+            for name, path in additions_list.items():
+                rules = self.read_rules(os.path.join(self.additions_path, path))
+                self.upsert(conn, name, path, rules)
+        
+        conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_additions_list', ?)", (str(time.time()),))
+    
+    @staticmethod
+    def read_rules(extension_path):
+        """Читает rules.json расширения, None если файл отсутствует или поврежден"""
+        try:
+            with open(os.path.join(extension_path, 'rules.json'), 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            return rules if isinstance(rules, dict) else None
+        except Exception:
+            return None
+    
+    def upsert(self, conn, name, path, rules):
+        if rules is None:
+            based_on, version, description = '', 'Неизвестно', 'Ошибка загрузки'
+        else:
+            based_on = str(rules.get('based_on', ''))
+            version = str(rules.get('version', 'Неизвестно'))
+            description = str(rules.get('description', 'Нет описания'))
+        
+        conn.execute("""
+            INSERT INTO extensions (name, path, based_on, version, description, rules, installed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                path = excluded.path, based_on = excluded.based_on, version = excluded.version,
+                description = excluded.description, rules = excluded.rules,
+                installed_at = excluded.installed_at
+        """, (name, path, based_on, version, description,
+              json.dumps(rules or {}, ensure_ascii=False), time.time()))
+    
+    def register(self, name, path, rules):
+        """Добавляет или обновляет расширение"""
+        with self.transaction() as conn:
+            self.upsert(conn, name, path, rules)
+    
+    def unregister(self, name):
+        """Удаляет расширение из реестра, возвращает его путь или None"""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT path FROM extensions WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM extensions WHERE name = ?", (name,))
+            return row['path']
+    
+    def get(self, name):
+        row = self.connect().execute("SELECT * FROM extensions WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+    
+    def query(self, name=None, based_on=None, version=None):
+        """Список расширений с фильтрами по имени, типу и версии"""
+        conditions, params = [], []
+        for column, value in (('name', name), ('based_on', based_on), ('version', version)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        
+        sql = "SELECT * FROM extensions"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY name"
+        return [dict(row) for row in self.connect().execute(sql, params)]
+
+class TrashCollector:
+    """Фоновое удаление папок, перенесенных в additions/.trash"""
+    def __init__(self, additions_path, batch_size=200, batch_pause=0.05):
+        self.trash_path = os.path.join(additions_path, '.trash')
+        os.makedirs(self.trash_path, exist_ok=True)
+        # Ограничение нагрузки на диск: пауза после каждой пачки удаленных файлов
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+    
+    def move_to_trash(self, path):
+        """Атомарно переносит папку в корзину, удаление произойдет в фоне"""
+        name = os.path.basename(os.path.normpath(path))
+        target = os.path.join(self.trash_path, f"{name}-{uuid.uuid4().hex}")
+        os.rename(path, target)
+        self.wakeup.set()
+        return target
+    
+    def start(self):
+        """Запускает сборщик; остатки после сбоя удаляются при первом проходе"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+    
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.clear()
+            self.collect()
+            self.wakeup.wait(60)
+    
+    def collect(self):
+        """Удаляет все, что лежит в корзине"""
+        for entry in os.listdir(self.trash_path):
+            if self.stopped.is_set():
+                return
+            self.remove_tree(os.path.join(self.trash_path, entry))
+    
+    def remove_tree(self, path):
+        removed = 0
+        if os.path.isdir(path) and not os.path.islink(path):
+            for root, dirs, files in os.walk(path, topdown=False):
+                for filename in files:
+                    self.remove(os.unlink, os.path.join(root, filename))
+                    removed += 1
+                    if removed % self.batch_size == 0:
+                        if self.stopped.is_set():
+                            return
+                        time.sleep(self.batch_pause)
+                for dirname in dirs:
+                    dir_path = os.path.join(root, dirname)
+                    self.remove(os.unlink if os.path.islink(dir_path) else os.rmdir, dir_path)
+            self.remove(os.rmdir, path)
+        else:
+            self.remove(os.unlink, path)
+    
+    @staticmethod
+    def remove(func, path):
+        try:
+            func(path)
+        except PermissionError:
+            # Файлы только для чтения (Windows): снимаем атрибут и пробуем еще раз
+            try:
+                os.chmod(path, 0o700)
+                func(path)
+            except OSError as e:
+                print(f"Не удалось удалить {path}: {e}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Не удаленное будет подобрано следующим проходом
+            print(f"Не удалось удалить {path}: {e}")
+
+class ArchiveCache:
+    """Кэш архивов расширений по содержимому (sha256) с вытеснением LRU"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS archive_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS archive_blobs_last_used ON archive_blobs(last_used);
+        CREATE TABLE IF NOT EXISTS archive_urls (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT
+        );
+    """
+    CHUNK_SIZE = 1024 * 1024
+    
+    def __init__(self, additions_path, registry, max_size=512 * 1024 * 1024):
+        self.cache_path = os.path.join(additions_path, '.cache', 'archives')
+        os.makedirs(self.cache_path, exist_ok=True)
+        self.registry = registry
+        self.max_size = max_size
+        self.stats_lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'offline_hits': 0, 'bytes_saved': 0}
+        
+        with registry.transaction() as conn:
+            for statement in self.SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
     
-    def save_additions_list(self, additions_list):
-        """Сохраняет список расширений"""
-        with open(self.additions_list_path, 'w', encoding='utf-8') as f:
-            json.dump(additions_list, f, ensure_ascii=False, indent=2)
+    def blob_path(self, sha256):
+        return os.path.join(self.cache_path, f"{sha256}.zip")
+    
+    def count(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+    
+    def lookup(self, url):
+        """Запись кэша для URL, если архив еще лежит на диске"""
+        row = self.registry.connect().execute("""
+            SELECT u.sha256, u.etag, u.last_modified, b.size FROM archive_urls u
+            JOIN archive_blobs b ON b.sha256 = u.sha256 WHERE u.url = ?
+        """, (url,)).fetchone()
+        if row and os.path.exists(self.blob_path(row['sha256'])):
+            return dict(row)
+        return None
+    
+    def touch(self, sha256):
+        with self.registry.transaction() as conn:
+            conn.execute("UPDATE archive_blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+    
+    def fetch(self, url):
+        """Возвращает путь к архиву: из кэша, после ревалидации или скачав заново"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        try:
+            response = requests.get(url, headers=headers, stream=True, timeout=30)
+        except requests.RequestException:
+            # Нет сети - отдаем то, что есть в кэше
+            if entry is None:
+                raise
+            self.count(hits=1, offline_hits=1, bytes_saved=entry['size'])
+            self.touch(entry['sha256'])
+            return self.blob_path(entry['sha256'])
+        
+        with response:
+            if response.status_code == 304 and entry:
+                self.count(hits=1, revalidated=1, bytes_saved=entry['size'])
+                self.touch(entry['sha256'])
+                return self.blob_path(entry['sha256'])
+            
+            response.raise_for_status()
+            self.count(misses=1)
+            sha256 = self.store(response.iter_content(self.CHUNK_SIZE), url,
+                                response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return self.blob_path(sha256)
+    
+    def store(self, chunks, url=None, etag=None, last_modified=None):
+        """Сохраняет архив из потока блоков, возвращает его sha256"""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.cache_path, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            # Одинаковое содержимое хранится один раз
+            os.replace(tmp_path, self.blob_path(sha256))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        with self.registry.transaction() as conn:
+            conn.execute("""
+                INSERT INTO archive_blobs (sha256, size, last_used) VALUES (?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET last_used = excluded.last_used
+            """, (sha256, size, time.time()))
+            if url:
+                conn.execute("""
+                    INSERT INTO archive_urls (url, sha256, etag, last_modified) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, etag = excluded.etag,
+                        last_modified = excluded.last_modified
+                """, (url, sha256, etag, last_modified))
+            self.evict(conn, keep=sha256)
+        return sha256
+    
+    def evict(self, conn, keep=None):
+        """Удаляет давно не использованные архивы, пока кэш больше max_size"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM archive_blobs").fetchone()[0]
+        if total <= self.max_size:
+            return
+        
+        for row in conn.execute("SELECT sha256, size FROM archive_blobs ORDER BY last_used").fetchall():
+            if total <= self.max_size:
+                break
+            if row['sha256'] == keep:
+                continue
+            conn.execute("DELETE FROM archive_blobs WHERE sha256 = ?", (row['sha256'],))
+            conn.execute("DELETE FROM archive_urls WHERE sha256 = ?", (row['sha256'],))
+            try:
+                os.remove(self.blob_path(row['sha256']))
+            except FileNotFoundError:
+                pass
+            total -= row['size']
+    
+    def import_directory(self, path):
+        """Импортирует заранее подготовленный кэш (для машин без сети)
+        
+        Берутся все *.zip из папки; необязательный index.json вида
+        {"url": "файл.zip"} связывает архивы с адресами загрузки.
+        """
+        urls = {}
+        index_path = os.path.join(path, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                for url, filename in json.load(f).items():
+                    urls.setdefault(filename, []).append(url)
+        
+        imported = 0
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith('.zip'):
+                continue
+            with open(os.path.join(path, filename), 'rb') as f:
+                chunks = iter(lambda: f.read(self.CHUNK_SIZE), b'')
+                sha256 = self.store(chunks)
+            for url in urls.get(filename, []):
+                with self.registry.transaction() as conn:
+                    conn.execute("""
+                        INSERT INTO archive_urls (url, sha256) VALUES (?, ?)
+                        ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, etag = NULL, last_modified = NULL
+                    """, (url, sha256))
+            imported += 1
+        return imported
+    
+    def get_stats(self):
+        """Статистика кэша: попадания, сэкономленные байты, размер"""
+        with self.stats_lock:
+            stats = dict(self.counters)
+        requests_total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests_total if requests_total else 0.0
+        
+        row = self.registry.connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM archive_blobs").fetchone()
+        stats['entries'] = row[0]
+        stats['size'] = row[1]
+        stats['max_size'] = self.max_size
+        return stats
+
+class BrowserChannel:
+    """IPC канал к браузеру через Unix-сокет из BROWSER_IPC_PATH"""
+    HEADER = struct.Struct('!I')
+    
+    def __init__(self, path, name, on_message):
+        self.path = path
+        self.name = name
+        self.on_message = on_message
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.reader_thread = None
+    
+    @classmethod
+    def from_environment(cls, on_message):
+        """Подключается к браузеру, если он передал путь к сокету"""
+        path = os.environ.get('BROWSER_IPC_PATH')
+        if not path or not hasattr(socket, 'AF_UNIX'):
+            return None
+        
+        channel = cls(path, os.environ.get('EXTENSION_NAME', 'Extension Manager'), on_message)
+        try:
+            channel.connect()
+        except OSError as e:
+            print(f"Не удалось подключиться к браузеру: {e}")
+            return None
+        return channel
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.reader_thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader_thread.start()
+    
+    def send(self, message):
+        payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+        try:
+            with self.send_lock:
+                self.sock.sendall(self.HEADER.pack(len(payload)) + payload)
+            return True
+        except OSError as e:
+            print(f"Ошибка отправки в браузер: {e}")
+            return False
+    
+    def request(self, message, timeout=1.0):
+        """Отправляет запрос и ждет ответ браузера, None по таймауту"""
+        request_id = next(self.request_ids)
+        done = threading.Event()
+        self.pending[request_id] = [done, None]
+        try:
+            if not self.send(dict(message, id=request_id)):
+                return None
+            done.wait(timeout)
+            return self.pending[request_id][1]
+        finally:
+            self.pending.pop(request_id, None)
+    
+    def reply(self, request, **fields):
+        fields.setdefault('type', 'reply')
+        fields['id'] = request.get('id')
+        self.send(fields)
+    
+    def recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("браузер закрыл соединение")
+            data += chunk
+        return bytes(data)
+    
+    def read_loop(self):
+        try:
+            while True:
+                (length,) = self.HEADER.unpack(self.recv_exact(self.HEADER.size))
+                message = json.loads(self.recv_exact(length))
+                
+                waiter = self.pending.get(message.get('id')) if message.get('type') in ('reply', 'pong') else None
+                if waiter:
+                    waiter[1] = message
+                    waiter[0].set()
+                elif message.get('type') == 'ping':
+                    self.reply(message, type='pong')
+                else:
+                    self.on_message(message)
+        except (OSError, ValueError) as e:
+            print(f"IPC канал закрыт: {e}")
+            self.on_message({'type': 'disconnected'})
+
+class Metrics:
+    """Счетчики и гистограммы менеджера в текстовом формате Prometheus
+    
+    Запись - одно сложение под общей блокировкой, корзина гистограммы
+    ищется до захвата блокировки; текст собирается только по запросу.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+    
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+    
+    @staticmethod
+    def label_key(labels):
+        # Значения меток всегда строки: иначе ключи с 200 и 'none' не сортируются
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, self.label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = (name, self.label_key(labels))
+        index = bisect.bisect_left(self.BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+    
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+    
+    def render(self, snapshot=()):
+        """Текст для /api/metrics; snapshot - внешние значения (name, kind, value, labels)"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self.histograms.items()}
+        
+        lines = []
+        described = set()
+        
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                text = self.help.get(name, (kind, name))[1]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+        
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{self.format_labels(labels)} {value}')
+        
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, hits in zip(self.BUCKETS + (float('inf'),), buckets):
+                cumulative += hits
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{self.format_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{self.format_labels(labels)} {total}')
+            lines.append(f'{name}_count{self.format_labels(labels)} {count}')
+        
+        for name, kind, value, labels in snapshot:
+            header(name, kind)
+            lines.append(f'{name}{self.format_labels(self.label_key(labels))} {value}')
+        
+        return '\n'.join(lines) + '\n'
+
+def normalize_route(path):
+    """Сводит путь запроса к шаблону маршрута, чтобы имена расширений не плодили метки"""
+    path = urlparse(path).path
+    if not path.startswith('/api/'):
+        return 'static'
+    for prefix in ('/api/install/', '/api/delete/', '/api/start/', '/api/stop/'):
+        if path.startswith(prefix):
+            return prefix + ':name'
+    if path in ('/api/extensions', '/api/remote', '/api/cache', '/api/cache/import', '/api/metrics'):
+        return path
+    return 'other'
+
+class ExtensionManager:
+    def __init__(self, additions_path):
+        self.additions_path = additions_path
+        self.registry = ExtensionRegistry(additions_path)
+        self.trash = TrashCollector(additions_path)
+        self.dependencies = DependencyInstaller(additions_path)
+        self.archive_cache = ArchiveCache(additions_path, self.registry,
+                                          int(os.environ.get('ARCHIVE_CACHE_SIZE_MB', 512)) * 1024 * 1024)
+        self.server = None
+        self.server_thread = None
+        self.name_locks = {}
+        self.name_locks_lock = threading.Lock()
+        self.channel = None
+        self.stop_requested = threading.Event()
+        self.pycache_root = os.path.join(additions_path, '.pycache')
+        self.metrics = Metrics()
+        self.metrics.describe('manager_http_requests_total', 'counter', 'HTTP запросы по маршруту и коду ответа')
+        self.metrics.describe('manager_http_request_duration_seconds', 'histogram', 'Время обработки HTTP запроса')
+        self.metrics.describe('manager_installs_total', 'counter', 'Установки расширений по результату')
+        self.metrics.describe('manager_install_duration_seconds', 'histogram', 'Время установки из архива')
+        self.metrics.describe('manager_install_bytes_total', 'counter', 'Размер установленных архивов')
+        self.metrics.describe('manager_bytecode_compile_duration_seconds', 'histogram', 'Время компиляции байткода при установке')
+        self.metrics.describe('manager_registry_scan_duration_seconds', 'histogram', 'Время чтения списка расширений из реестра')
+        self.metrics.describe('manager_errors_total', 'counter', 'Ошибки по виду операции')
+    
+    def pycache_path(self, name):
+        """Папка байткода расширения внутри общего PYTHONPYCACHEPREFIX"""
+        return pycache_mirror(self.pycache_root, extension_path(self.additions_path, name))
+    
+    def lock_for(self, name):
+        """Блокировка папки конкретного расширения: установки разных расширений идут параллельно"""
+        with self.name_locks_lock:
+            return self.name_locks.setdefault(name, threading.Lock())
+    
+    def connect_browser(self):
+        """Подключается к IPC каналу браузера, если он доступен"""
+        self.channel = BrowserChannel.from_environment(self.handle_browser_message)
+        return self.channel is not None
+    
+    def handle_browser_message(self, message):
+        """Обрабатывает команды браузера"""
+        message_type = message.get('type')
+        if message_type == 'status':
+            self.channel.reply(message, port=self.server.server_address[1] if self.server else None,
+                               extensions=len(self.registry.query()))
+        elif message_type == 'install':
+            # Установка может быть долгой, не задерживаем чтение канала
+            threading.Thread(target=self.install_from_browser, args=(message,), daemon=True).start()
+        elif message_type in ('stop', 'disconnected'):
+            self.stop_requested.set()
+    
+    def install_from_browser(self, message):
+        """Устанавливает архив, скачанный браузером"""
+        success, text = self.install_archive(message.get('name'), message.get('path', ''))
+        self.channel.reply(message, success=success, message=text)
+    
+    def notify_registry_changed(self, name, action):
+        if self.channel:
+            self.channel.send({'type': 'registry_changed', 'name': name, 'action': action})
+    
+    def browser_command(self, command, name):
+        """Просит браузер запустить или остановить расширение"""
+        if not self.channel:
+            return False, "Нет связи с браузером"
+        
+        reply = self.channel.request({'type': command, 'name': name}, timeout=5.0)
+        if reply is None:
+            return False, "Браузер не ответил"
+        if not reply.get('success'):
+            return False, "Команда не выполнена"
+        return True, "Готово"
     
     def get_installed_extensions(self):
         """Возвращает список установленных расширений"""
-        additions_list = self.load_additions_list()
-        installed = []
+        running = {}
+        if self.channel:
+            reply = self.channel.request({'type': 'status'})
+            if reply:
+                running = reply.get('extensions', {})
         
-        for name, path in additions_list.items():
-            extension_path = os.path.join(self.additions_path, path)
-            rules_file = os.path.join(extension_path, 'rules.json')
-            
-            if os.path.exists(rules_file):
-                try:
-                    with open(rules_file, 'r', encoding='utf-8') as f:
-                        rules = json.load(f)
-                    
-                    installed.append({
-                        'name': name,
-                        'path': path,
-                        'description': rules.get('description', 'Нет описания'),
-                        'version': rules.get('version', 'Неизвестно'),
-                        'based_on': rules.get('based_on', ''),
-                        'running': False  # Можно добавить проверку статуса
-                    })
-                except:
-                    installed.append({
-                        'name': name,
-                        'path': path,
-                        'description': 'Ошибка загрузки',
-                        'version': 'Неизвестно',
-                        'based_on': '',
-                        'running': False
-                    })
-        
-        return installed
+        with self.metrics.timer('manager_registry_scan_duration_seconds'):
+            extensions = self.registry.query()
+        
+        return [{
+            'name': ext['name'],
+            'path': ext['path'],
+            'description': ext['description'],
+            'version': ext['version'],
+            'based_on': ext['based_on'],
+            'running': running.get(ext['name'], False)
+        } for ext in extensions]
     
     def download_extension(self, name, github_url):
         """Скачивает и устанавливает расширение"""
         try:
-            # Скачиваем архив
-            response = requests.get(github_url)
-            response.raise_for_status()
-            
-            # Создаем папку для расширения
-            extension_dir = os.path.join(self.additions_path, name)
-            if os.path.exists(extension_dir):
-                shutil.rmtree(extension_dir)
-            os.makedirs(extension_dir, exist_ok=True)
-            
-            # Распаковываем архив
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
-                zip_ref.extractall(extension_dir)
-            
-            # Добавляем в additions_list.json
-            additions_list = self.load_additions_list()
-            additions_list[name] = f"{name}/"
-            self.save_additions_list(additions_list)
+            # Скачиваем архив (или берем из кэша)
+            archive_path = self.archive_cache.fetch(github_url)
+        except Exception as e:
+            self.metrics.inc('manager_errors_total', kind='download')
+            return False, f"Ошибка установки: {str(e)}"
+        
+        return self.install_archive(name, archive_path)
+    
+    def install_archive(self, name, archive_path):
+        """Устанавливает расширение из локального zip-архива"""
+        started = time.perf_counter()
+        try:
+            extension_dir = extension_path(self.additions_path, name)
+            with self.lock_for(name):
+                # Создаем папку для расширения
+                if os.path.exists(extension_dir):
+                    self.trash.move_to_trash(extension_dir)
+                os.makedirs(extension_dir, exist_ok=True)
+                
+                # Распаковываем архив
+                extract_archive(archive_path, extension_dir)
+                
+                rules = self.registry.read_rules(extension_dir)
+                if rules and rules.get('based_on') == 'exe' and isinstance(rules.get('start'), str):
+                    try:
+                        make_executable(extension_dir, rules['start'])
+                    except ValueError:
+                        self.trash.move_to_trash(extension_dir)
+                        raise
+                
+                # Зависимости python-расширения ставятся в его собственное окружение
+                if rules and rules.get('based_on') == 'python' and rules.get('dependencies'):
+                    try:
+                        self.dependencies.install(extension_dir, rules['dependencies'])
+                    except Exception:
+                        self.trash.move_to_trash(extension_dir)
+                        raise
+                
+                # Байткод старой версии не сверяется с исходниками - убираем его
+                pycache_path = self.pycache_path(name)
+                if os.path.exists(pycache_path):
+                    self.trash.move_to_trash(pycache_path)
+                if rules and rules.get('based_on') == 'python':
+                    with self.metrics.timer('manager_bytecode_compile_duration_seconds'):
+                        compile_bytecode(extension_dir, self.pycache_root)
+                
+                # Регистрируем в реестре
+                self.registry.register(name, f"{name}/", rules)
             
+            self.metrics.observe('manager_install_duration_seconds', time.perf_counter() - started)
+            self.metrics.inc('manager_install_bytes_total', os.path.getsize(archive_path))
+            self.metrics.inc('manager_installs_total', result='success')
+            self.notify_registry_changed(name, 'install')
             return True, "Расширение успешно установлено!"
             
         except Exception as e:
+            self.metrics.inc('manager_installs_total', result='error')
+            self.metrics.inc('manager_errors_total', kind='install')
             return False, f"Ошибка установки: {str(e)}"
     
     def delete_extension(self, name):
         """Удаляет расширение"""
         try:
-            additions_list = self.load_additions_list()
-            
-            if name in additions_list:
-                # Удаляем папку расширения
-                extension_path = os.path.join(self.additions_path, additions_list[name])
-                if os.path.exists(extension_path):
-                    shutil.rmtree(extension_path)
-                
-                # Удаляем из списка
-                del additions_list[name]
-                self.save_additions_list(additions_list)
+            extension_path(self.additions_path, name)
+            with self.lock_for(name):
+                entry = self.registry.get(name)
+                if entry is None:
+                    return False, "Расширение не найдено!"
+                # Путь из реестра тоже проверяем: папка должна лежать прямо в additions
+                extension_dir = extension_path(self.additions_path, entry['path'].rstrip('/\\'))
+                self.registry.unregister(name)
                 
-                return True, "Расширение успешно удалено!"
-            else:
-                return False, "Расширение не найдено!"
+                # Переносим папку в корзину, файлы удалит фоновый сборщик
+                if os.path.exists(extension_dir):
+                    self.trash.move_to_trash(extension_dir)
+                pycache_path = self.pycache_path(name)
+                if os.path.exists(pycache_path):
+                    self.trash.move_to_trash(pycache_path)
+            
+            self.notify_registry_changed(name, 'delete')
+            return True, "Расширение успешно удалено!"
                 
         except Exception as e:
+            self.metrics.inc('manager_errors_total', kind='delete')
             return False, f"Ошибка удаления: {str(e)}"
     
-    def start_server(self):
-        """Запускает HTTP сервер"""
+    def render_metrics(self):
+        """Метрики менеджера, снимок кэша архивов и метрики браузера, если он подключен"""
+        stats = self.archive_cache.get_stats()
+        # Счетчики кэша только растут, размер и число записей - мгновенные значения
+        snapshot = [(f'manager_archive_cache_{key}_total', 'counter', stats[key], {})
+                    for key in ('hits', 'misses', 'revalidated', 'offline_hits', 'bytes_saved')]
+        snapshot += [(f'manager_archive_cache_{key}', 'gauge', stats[key], {}) for key in ('entries', 'size')]
+        snapshot.append(('manager_trash_pending', 'gauge', len(os.listdir(self.trash.trash_path))
+                         if os.path.isdir(self.trash.trash_path) else 0, {}))
+        text = self.metrics.render(snapshot)
+        
+        # Метрики браузера (вкладки, рендереры, процессы расширений) приходят по IPC
+        if self.channel:
+            reply = self.channel.request({'type': 'metrics'})
+            if reply:
+                text += reply.get('text', '')
+        return text
+    
+    def start_server(self, port=5000, sock=None):
+        """Запускает HTTP сервер; port=0 - любой свободный порт, sock - сокет от браузера"""
+        manager = self
         class ExtensionHandler(SimpleHTTPRequestHandler):
             def __init__(self, *args, **kwargs):
                 super().__init__(*args, directory=os.path.dirname(__file__), **kwargs)
             
             def do_GET(self):
-                if self.path == '/':
-                    self.path = '/manager.html'
-                elif self.path.startswith('/api/'):
-                    self.handle_api()
-                    return
-                return super().do_GET()
+                route = normalize_route(self.path)
+                started = time.perf_counter()
+                self.status_code = None
+                try:
+                    if self.path == '/':
+                        self.path = '/manager.html'
+                    elif self.path.startswith('/api/'):
+                        try:
+                            self.handle_api()
+                        except Exception:
+                            manager.metrics.inc('manager_errors_total', kind='api')
+                            raise
+                        return
+                    return super().do_GET()
+                finally:
+                    manager.metrics.observe('manager_http_request_duration_seconds',
+                                            time.perf_counter() - started, route=route)
+                    manager.metrics.inc('manager_http_requests_total', route=route,
+                                        code=str(self.status_code or 'none'))
+            
+            def log_request(self, code='-', size='-'):
+                # Код ответа запоминается для метрик
+                self.status_code = getattr(code, 'value', code)
+                super().log_request(code, size)
             
             def handle_api(self):
                 if self.path == '/api/extensions':
@@ -159,27 +1105,99 @@ class ExtensionManager:
                     name = self.path.split('/')[-1]
                     success, message = manager.delete_extension(name)
                     self.send_json({'success': success, 'message': message})
+                
+                elif self.path == '/api/cache':
+                    self.send_json(manager.archive_cache.get_stats())
+                
+                elif self.path.startswith('/api/cache/import'):
+                    params = parse_qs(urlparse(self.path).query)
+                    path = params.get('path', [''])[0]
+                    
+                    if path and os.path.isdir(path):
+                        imported = manager.archive_cache.import_directory(path)
+                        self.send_json({'success': True, 'message': f"Импортировано архивов: {imported}"})
+                    else:
+                        self.send_json({'success': False, 'message': 'Папка не найдена'})
+                
+                elif self.path.startswith(('/api/start/', '/api/stop/')):
+                    command = self.path.split('/')[2]
+                    name = unquote(self.path.split('/')[-1])
+                    success, message = manager.browser_command(command, name)
+                    self.send_json({'success': success, 'message': message})
+                
+                elif self.path == '/api/metrics':
+                    self.send_text(manager.render_metrics(), 'text/plain; version=0.0.4; charset=utf-8')
+                
+                else:
+                    self.send_json({'success': False, 'message': 'Неизвестный запрос'}, status=404)
             
-            def send_json(self, data):
+            def send_text(self, text, content_type):
                 self.send_response(200)
+                self.send_header('Content-type', content_type)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(text.encode('utf-8'))
+            
+            def send_json(self, data, status=200):
+                self.send_response(status)
                 self.send_header('Content-type', 'application/json')
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 self.wfile.write(json.dumps(data).encode('utf-8'))
         
-        # Создаем и запускаем сервер в отдельном потоке
-        self.server = HTTPServer(('localhost', 5000), ExtensionHandler)
+        # Создаем и запускаем сервер в отдельном потоке, запросы обрабатываются параллельно
+        if sock is not None:
+            # Сокет уже открыт браузером (запуск по первому подключению)
+            self.server = ThreadingHTTPServer(sock.getsockname(), ExtensionHandler, bind_and_activate=False)
+            self.server.socket.close()
+            self.server.socket = sock
+            self.server.server_address = sock.getsockname()
+        else:
+            self.server = ThreadingHTTPServer(('localhost', port), ExtensionHandler)
         self.server_thread = threading.Thread(target=self.server.serve_forever)
         self.server_thread.daemon = True
         self.server_thread.start()
+        self.trash.start()
         
-        print("Extension manager server started on http://localhost:5000")
+        print(f"Extension manager server started on http://localhost:{self.server.server_address[1]}")
     
     def stop_server(self):
         """Останавливает сервер"""
         if self.server:
             self.server.shutdown()
             self.server_thread.join()
+        self.trash.stop()
+
+def ensure_environment(additions_path):
+    """Перезапускает менеджер в его .venv, создав окружение при первом запуске
+    
+    Менеджер поставляется с браузером и не проходит через install_archive,
+    поэтому зависимости из его rules.json ставятся здесь, до запуска сервера.
+    Переменные окружения и дескриптор LISTEN_FD переживают перезапуск.
+    """
+    if sys.prefix != sys.base_prefix:
+        return
+    
+    own_dir = os.path.dirname(os.path.abspath(__file__))
+    dependencies = (ExtensionRegistry.read_rules(own_dir) or {}).get('dependencies') or []
+    if not dependencies:
+        return
+    
+    venv_path = os.path.join(own_dir, '.venv')
+    venv_python = DependencyInstaller.venv_python(venv_path)
+    if not os.path.exists(venv_python):
+        print("Первый запуск: устанавливаем зависимости менеджера расширений...")
+        try:
+            DependencyInstaller(additions_path).install(own_dir, dependencies)
+        except Exception as e:
+            print(f"Не удалось создать окружение менеджера: {e}")
+            # Неполное окружение нельзя оставлять: следующий запуск взял бы его как готовое
+            if os.path.exists(venv_path):
+                TrashCollector(additions_path).move_to_trash(venv_path)
+            return
+    
+    sys.stdout.flush()
+    os.execv(venv_python, [venv_python, os.path.abspath(__file__)] + sys.argv[1:])
 
 # Глобальный экземпляр менеджера
 manager = None
@@ -190,16 +1208,50 @@ def main():
     additions_path = os.environ.get('ADDITIONS_PATH', os.path.join(os.path.dirname(__file__), '..'))
     additions_path = os.path.abspath(additions_path)
     
+    # Заранее подготовленные колеса нужны уже для окружения самого менеджера
+    wheels_path = os.environ.get('WHEELHOUSE_SEED')
+    if wheels_path and os.path.isdir(wheels_path):
+        print(f"Импортировано колес: {DependencyInstaller(additions_path).import_directory(wheels_path)}")
+    
+    ensure_environment(additions_path)
+    if requests is None:
+        venv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.venv')
+        if os.path.realpath(sys.prefix) == os.path.realpath(venv_path):
+            # Окружение осталось от неудачной установки - при следующем запуске оно создается заново
+            TrashCollector(additions_path).move_to_trash(venv_path)
+            print("Менеджеру расширений нужен пакет requests: окружение .venv неполное и удалено, перезапустите менеджер")
+        else:
+            print("Менеджеру расширений нужен пакет requests: окружение .venv не создано")
+        return
+    
     manager = ExtensionManager(additions_path)
-    manager.start_server()
+    
+    # Заранее подготовленный кэш архивов для машин без сети
+    seed_path = os.environ.get('ARCHIVE_CACHE_SEED')
+    if seed_path and os.path.isdir(seed_path):
+        print(f"Импортировано архивов в кэш: {manager.archive_cache.import_directory(seed_path)}")
+    
+    listen_fd = os.environ.get('LISTEN_FD')
+    connected = manager.connect_browser()
+    if listen_fd:
+        manager.start_server(sock=socket.socket(fileno=int(listen_fd)))
+    elif connected:
+        # Через IPC браузер узнает порт, поэтому можно занять любой свободный
+        manager.start_server(port=0)
+    else:
+        manager.start_server()
+    
+    if connected:
+        manager.channel.send({'type': 'hello', 'name': manager.channel.name,
+                              'port': manager.server.server_address[1]})
     
     try:
-        # Бесконечный цикл для поддержания работы сервера
-        import time
-        while True:
-            time.sleep(1)
+        # Работаем, пока браузер не попросит остановиться
+        while not manager.stop_requested.wait(1):
+            pass
     except KeyboardInterrupt:
-        manager.stop_server()
+        pass
+    manager.stop_server()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+"""Масштабирование распаковки архивов расширений по числу потоков
+
+Собирает синтетический архив (по умолчанию 20000 файлов), распаковывает его
+через zipfile.extractall и через extract_archive с разным числом потоков,
+печатает результат в JSON:
+
+    python extract_benchmark.py --files 20000 --repeat 3 --workers 1,2,4,8
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotePad'))
+
+import menager
+
+def build_archive(path, files, size):
+    """Архив из мелких сжатых файлов во вложенных папках, как у расширений"""
+    rng = random.Random(0)
+    words = [f"token{i}" for i in range(500)]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('rules.json', json.dumps({'name': 'Benchmark', 'based_on': 'html'}))
+        for i in range(files):
+            content = ' '.join(rng.choice(words) for _ in range(size // 8))
+            archive.writestr(f"static/{i % 50}/{i // 50 % 20}/file{i}.js", content)
+
+def timed(extract, archive_path, work_dir, repeat):
+    """Лучшее время из repeat запусков, каждый раз в пустую папку"""
+    best = None
+    for attempt in range(repeat):
+        destination = os.path.join(work_dir, f"out{attempt}")
+        started = time.perf_counter()
+        extract(archive_path, destination)
+        elapsed = time.perf_counter() - started
+        shutil.rmtree(destination)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def extractall(archive_path, destination):
+    with zipfile.ZipFile(archive_path) as zip_ref:
+        zip_ref.extractall(destination)
+
+def main():
+    parser = argparse.ArgumentParser(description="Распаковка архива в несколько потоков")
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=4096, help="примерный размер файла в байтах")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', default='1,2,4,8', help="число потоков через запятую")
+    parser.add_argument('--dir', default=None, help="рабочая папка (например, tmpfs, чтобы убрать шум диска)")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({int(count) for count in args.workers.split(',')} | {cpu_count})
+
+    work_dir = tempfile.mkdtemp(prefix='extract_benchmark_', dir=args.dir)
+    try:
+        archive_path = os.path.join(work_dir, 'extension.zip')
+        build_archive(archive_path, args.files, args.size)
+
+        baseline = timed(extractall, archive_path, work_dir, args.repeat)
+        result = {
+            'files': args.files,
+            'archive_mb': round(os.path.getsize(archive_path) / 1024 / 1024, 1),
+            'cpu_count': cpu_count,
+            'extractall_s': round(baseline, 3),
+            'extract_archive': []
+        }
+        for workers in worker_counts:
+            elapsed = timed(lambda a, d: menager.extract_archive(a, d, workers=workers),
+                            archive_path, work_dir, args.repeat)
+            result['extract_archive'].append({
+                'workers': workers,
+                'seconds': round(elapsed, 3),
+                'speedup_vs_extractall': round(baseline / elapsed, 2)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
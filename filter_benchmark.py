@@ -0,0 +1,137 @@
+"""Скорость блокировщика запросов на больших списках фильтров
+
+Генерирует списки правил (по умолчанию 100000: домены, hosts, подстроки
+путей, шаблоны с '*', исключения) и набор адресов, меряет разбор с
+компиляцией, загрузку из кэша .compiled и проверку одного адреса,
+печатает результат в JSON:
+
+    python filter_benchmark.py --rules 100000 --urls 20000 --shared 2000
+
+--shared добавляет шаблоны с общим куском ("/ad1/*/pixel.gif",
+"/ad2/*/pixel.gif"...) и адреса, где этот кусок есть. Проверка идет в
+потоке интерфейса, поэтому отдельно считается, сколько адресов не
+уложились в --budget-us.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+def make_rules(count, shared, rng):
+    """Смесь правил в пропорциях, близких к EasyList и hosts-спискам"""
+    rules = ['! Title: Benchmark list', '[Adblock Plus 2.0]']
+    rules.extend(f"/ad{i}/*/pixel.gif" for i in range(shared))
+    domains = []
+    for i in range(count):
+        kind = i % 10
+        domain = f"ads{i}.tracker{rng.randrange(5000)}.{rng.choice(['com', 'net', 'ru', 'io'])}"
+        if kind < 5:
+            domains.append(domain)
+            rules.append(f"||{domain}^")
+        elif kind == 5:
+            domains.append(domain)
+            rules.append(f"0.0.0.0 {domain}")
+        elif kind == 6:
+            rules.append(f"/banner{i}/img")
+        elif kind == 7:
+            rules.append(f"-ad{i}-banner*.gif")
+        elif kind == 8:
+            rules.append(f"||{domain}^$third-party")
+        else:
+            rules.append(f"@@||cdn{i}.example.org^")
+    return rules, domains
+
+def make_urls(count, rule_count, domains, rng):
+    """Адреса: часть попадает в правила, большая часть - обычные ресурсы"""
+    urls = []
+    for i in range(count):
+        kind = i % 10
+        if kind == 0:
+            host = rng.choice(domains)
+            urls.append((host, f"https://{host}/track.js?id={i}"))
+        elif kind == 1:
+            urls.append(('static.example.com', f"https://static.example.com/banner{rng.randrange(6, rule_count, 10)}/img.png"))
+        elif kind == 2:
+            urls.append(('img.example.com', f"https://img.example.com/x-ad{rng.randrange(7, rule_count, 10)}-banner-300.gif"))
+        elif kind == 3:
+            # Общий кусок шаблонов с '*' без их начала: худший случай для проверки
+            urls.append(('pixel.example.com', f"https://pixel.example.com/img/{i}/pixel.gif"))
+        else:
+            host = f"site{rng.randrange(1000)}.example.com"
+            urls.append((host, f"https://{host}/assets/{rng.randrange(10 ** 6)}/app.{rng.choice(['js', 'css', 'png'])}?v={i}"))
+    return urls
+
+def summarize_us(values):
+    """Медиана, 95-й перцентиль и максимум в микросекундах"""
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'median_us': round(statistics.median(ordered) * 1e6, 1),
+        'p95_us': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6, 1),
+        'max_us': round(ordered[-1] * 1e6, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость правил блокировки")
+    parser.add_argument('--rules', type=int, default=100000)
+    parser.add_argument('--urls', type=int, default=20000)
+    parser.add_argument('--shared', type=int, default=2000, help="шаблонов с общим куском")
+    parser.add_argument('--budget-us', type=float, default=100, help="допустимое время одной проверки")
+    args = parser.parse_args()
+
+    from main import FilterRules
+
+    rng = random.Random(0)
+    rules, domains = make_rules(args.rules, args.shared, rng)
+    urls = make_urls(args.urls, args.rules, domains, rng)
+
+    filters_path = tempfile.mkdtemp(prefix='filter_benchmark_')
+    try:
+        with open(os.path.join(filters_path, 'benchmark.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(rules) + '\n')
+
+        started = time.perf_counter()
+        FilterRules.load(filters_path)
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        compiled = FilterRules.load(filters_path)
+        warm = time.perf_counter() - started
+        cache_size = os.path.getsize(os.path.join(filters_path, '.compiled'))
+    finally:
+        shutil.rmtree(filters_path, ignore_errors=True)
+
+    # Первый проход компилирует регулярные выражения шаблонов с '*', меряется второй
+    for host, url in urls:
+        compiled.matches(host, url)
+    latencies = []
+    blocked = 0
+    for host, url in urls:
+        started = time.perf_counter()
+        result = compiled.matches(host, url)
+        latencies.append(time.perf_counter() - started)
+        blocked += result
+
+    result = {
+        'rules': args.rules,
+        'domains': len(compiled.domains),
+        'automaton_states': len(compiled.fail),
+        'wildcards': len(compiled.wildcards),
+        'parse_and_compile_s': round(cold, 3),
+        'load_from_cache_s': round(warm, 3),
+        'cache_mb': round(cache_size / 1024 / 1024, 1),
+        'urls': len(urls),
+        'blocked': blocked,
+        'match': summarize_us(latencies),
+        'over_budget': sum(1 for latency in latencies if latency * 1e6 > args.budget_us)
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Сравнение IPC канала браузера с опросом расширения по HTTP
+
+Меряет время ответа на ping через IpcServer/BrowserChannel и время
+запроса статуса к HTTP серверу расширения (новое соединение на каждый
+опрос, как у HTTP/1.0 сервера менеджера), печатает результат в JSON:
+
+    python ipc_benchmark.py --requests 2000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+import http.client
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from load_harness import QEventLoop, QTimer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotePad'))
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Ответ как у /api/extensions менеджера: небольшой JSON"""
+
+    def do_GET(self):
+        body = json.dumps({'Extension Manager': True}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def summarize_us(values):
+    """Медиана, 95-й перцентиль и максимум в микросекундах"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'median_us': round(statistics.median(ordered) * 1e6, 1),
+        'p95_us': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6, 1),
+        'max_us': round(ordered[-1] * 1e6, 1)
+    }
+
+def measure_http(port, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request('GET', '/api/extensions')
+        connection.getresponse().read()
+        connection.close()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def measure_ipc(browser_module, menager, count):
+    """ping/pong: запросы идут из потока расширения, ответы дает цикл событий браузера"""
+    server = browser_module.IpcServer()
+    channel = menager.BrowserChannel(server.path, 'Benchmark', lambda message: None)
+    channel.connect()
+
+    latencies = []
+    done = threading.Event()
+
+    def run():
+        for _ in range(count):
+            started = time.perf_counter()
+            if channel.request({'type': 'ping'}, timeout=2.0) is None:
+                break
+            latencies.append(time.perf_counter() - started)
+        done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    loop = QEventLoop()
+    poll = QTimer()
+    poll.timeout.connect(lambda: done.is_set() and loop.quit())
+    poll.start(10)
+    loop.exec()
+    poll.stop()
+
+    channel.sock.close()
+    server.close()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC канал против опроса по HTTP")
+    parser.add_argument('--requests', type=int, default=1000, help="число запросов каждого вида")
+    parser.add_argument('--poll-interval-ms', type=int, default=250,
+                        help="интервал опроса, по которому оценивается задержка обнаружения изменений")
+    args = parser.parse_args()
+
+    import main as browser_module
+    import menager
+    from PySide6.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), StatusHandler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    port = http_server.server_address[1]
+
+    result = {
+        'requests': args.requests,
+        'ipc_round_trip': summarize_us(measure_ipc(browser_module, menager, args.requests)),
+        'http_request': summarize_us(measure_http(port, args.requests)),
+        # При опросе изменение замечается в среднем через половину интервала плюс сам запрос,
+        # по IPC сообщение (hello, registry_changed) приходит сразу
+        'poll_interval_ms': args.poll_interval_ms,
+        'poll_detection_delay_mean_ms': args.poll_interval_ms / 2
+    }
+    http_server.shutdown()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
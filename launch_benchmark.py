@@ -0,0 +1,108 @@
+"""Холодный запуск python-расширения с байткодом, скомпилированным при установке, и без него
+
+Собирает архив большого синтетического расширения, устанавливает его через
+ExtensionManager.install_archive (вместе с компиляцией байткода) и
+запускает так же, как браузер: интерпретатором extension_python и с
+PYTHONPYCACHEPREFIX. Без компиляции каждый запуск получает пустой префикс,
+как первый запуск до этого изменения. Результат печатается в JSON:
+
+    python launch_benchmark.py --modules 400 --functions 300 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotePad'))
+
+import menager
+
+# Модули стандартной библиотеки, которые обычно тянет серверное расширение
+STDLIB_IMPORTS = ['json', 'sqlite3', 'asyncio', 'http.server', 'email.mime.multipart',
+                  'xml.etree.ElementTree', 'decimal', 'logging.handlers', 'urllib.request']
+
+def build_archive(path, modules, functions):
+    """Расширение из пакета app с modules модулями по functions функций"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('rules.json', json.dumps({
+            'name': 'Launch Benchmark', 'based_on': 'python', 'start': 'main.py'
+        }))
+        archive.writestr('app/__init__.py', '')
+        for i in range(modules):
+            body = '\n'.join(
+                f"def handler_{j}(request, limit={j}):\n"
+                f"    items = [x * {j} for x in range(limit) if x % 3]\n"
+                f"    return {{'module': {i}, 'handler': {j}, 'total': sum(items)}}\n"
+                for j in range(functions)
+            )
+            archive.writestr(f'app/mod{i}.py', body)
+        imports = '\n'.join(f"import {name}" for name in STDLIB_IMPORTS)
+        imports += '\n' + '\n'.join(f"import app.mod{i}" for i in range(modules))
+        archive.writestr('main.py', imports + "\nprint('ready')\n")
+
+def launch(python, extension_dir, pycache_root):
+    """Время от запуска процесса до его завершения после импорта всех модулей"""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_root)
+    started = time.perf_counter()
+    subprocess.run([python, os.path.join(extension_dir, 'main.py')], cwd=extension_dir,
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+def summarize_s(values):
+    return {
+        'median_s': round(statistics.median(values), 3),
+        'min_s': round(min(values), 3),
+        'max_s': round(max(values), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Холодный запуск python-расширения")
+    parser.add_argument('--modules', type=int, default=400)
+    parser.add_argument('--functions', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='launch_benchmark_')
+    try:
+        additions_path = os.path.join(work_dir, 'additions')
+        os.makedirs(additions_path)
+        archive_path = os.path.join(work_dir, 'extension.zip')
+        build_archive(archive_path, args.modules, args.functions)
+
+        manager = menager.ExtensionManager(additions_path)
+        started = time.perf_counter()
+        ok, message = manager.install_archive('LaunchBenchmark', archive_path)
+        install = time.perf_counter() - started
+        if not ok:
+            print(message)
+            return 1
+        extension_dir = menager.extension_path(additions_path, 'LaunchBenchmark')
+        python = menager.extension_python(extension_dir)
+
+        cold = []
+        for attempt in range(args.repeat):
+            # Пустой префикс на каждый запуск: python компилирует и расширение, и стандартную библиотеку
+            cold.append(launch(python, extension_dir, os.path.join(work_dir, f'empty{attempt}')))
+        precompiled = [launch(python, extension_dir, manager.pycache_root) for _ in range(args.repeat)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {
+        'modules': args.modules,
+        'functions': args.functions,
+        'python': python,
+        'install_with_compile_s': round(install, 3),
+        'cold_launch_without_bytecode': summarize_s(cold),
+        'cold_launch_with_bytecode': summarize_s(precompiled)
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,480 @@
+"""Нагрузочный прогон браузера без экрана
+
+Запускает окно Browser на платформе offscreen против локального
+тестового HTTP сервера, открывает и закрывает вкладки, запускает и
+останавливает синтетические расширения и печатает замеры в JSON:
+
+    python load_harness.py --tabs 30 --extensions 5 --preset economy > result.json
+
+В режиме prediction вместо этого меряет время до первой отрисовки
+страницы, набранной в адресной строке, без предсказания, с preconnect и
+с предзагрузкой адреса из истории:
+
+    python load_harness.py --mode prediction --trials 10 --extensions 0
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# В контейнерах браузер обычно запущен от root, где песочница Chromium не стартует
+os.environ.setdefault('QTWEBENGINE_DISABLE_SANDBOX', '1')
+
+from PySide6.QtCore import QEventLoop, QTimer, QUrl
+
+# Код синтетического расширения: HTTP сервер на свободном порту (или на
+# сокете от браузера) и hello с портом по IPC
+EXTENSION_SCRIPT = r'''
+import os, json, socket, struct
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"<html><head><title>{os.environ.get('EXTENSION_NAME')}</title></head><body>ok</body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+if os.environ.get('LISTEN_FD'):
+    sock = socket.socket(fileno=int(os.environ['LISTEN_FD']))
+    server = ThreadingHTTPServer(sock.getsockname(), Handler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.server_address = sock.getsockname()
+else:
+    server = ThreadingHTTPServer(('localhost', 0), Handler)
+
+if os.environ.get('BROWSER_IPC_PATH'):
+    channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    channel.connect(os.environ['BROWSER_IPC_PATH'])
+    payload = json.dumps({'type': 'hello', 'name': os.environ['EXTENSION_NAME'],
+                          'port': server.server_address[1]}).encode()
+    channel.sendall(struct.pack('!I', len(payload)) + payload)
+
+server.serve_forever()
+'''
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Страницы /page/<n> заданного размера для вкладок"""
+    page_kb = 64
+
+    def do_GET(self):
+        filler = '<p>' + 'Lorem ipsum dolor sit amet. ' * 36 + '</p>\n'
+        paragraphs = max(1, self.page_kb * 1024 // len(filler))
+        body = (f"<html><head><title>Страница {self.path}</title></head><body>"
+                f"<h1>{self.path}</h1>{filler * paragraphs}"
+                f"<script>document.body.dataset.ready = '1';</script></body></html>").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """Страница для замера первой отрисовки: новое соединение дорогое, ответ кэшируется"""
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят разными записями, с Nagle повторный запрос ждал бы ~40 мс
+    disable_nagle_algorithm = True
+    connect_delay = 0.15
+
+    def setup(self):
+        # Пауза на каждое новое соединение заменяет DNS, TCP и TLS настоящей сети
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        body = (f"<html><head><title>{self.path}</title></head><body><h1>{self.path}</h1>"
+                f"<p>{'Lorem ipsum dolor sit amet. ' * 40}</p></body></html>").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'max-age=600')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# Время первой отрисовки по Paint Timing в миллисекундах от начала эпохи, 0 если ее нет
+FIRST_PAINT_SCRIPT = """
+(() => {
+    const paint = performance.getEntriesByName('first-contentful-paint')[0]
+        || performance.getEntriesByName('first-paint')[0];
+    return paint ? performance.timeOrigin + paint.startTime : 0;
+})()
+"""
+
+def start_stub_server(page_kb):
+    """Запускает тестовый HTTP сервер на свободном порту"""
+    handler = type('Handler', (StubHandler,), {'page_kb': page_kb})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_prediction_server(connect_delay_ms):
+    """Отдельный сервер на свободном порту: у каждого замера свой источник без теплых соединений"""
+    handler = type('Handler', (PredictionHandler,), {'connect_delay': connect_delay_ms / 1000})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+def create_additions(path, count, socket_activation):
+    """Создает папку additions с синтетическими python-расширениями"""
+    additions = {}
+    for i in range(count):
+        name = f"Synthetic {i}"
+        extension_dir = os.path.join(path, f"synthetic_{i}")
+        os.makedirs(extension_dir, exist_ok=True)
+        with open(os.path.join(extension_dir, 'app.py'), 'w', encoding='utf-8') as f:
+            f.write(EXTENSION_SCRIPT)
+
+        rules = {
+            'name': name,
+            'based_on': 'python',
+            'start': 'app.py',
+            'link': f"http://localhost:{free_port()}/"
+        }
+        if socket_activation:
+            rules['activation'] = 'socket'
+        with open(os.path.join(extension_dir, 'rules.json'), 'w', encoding='utf-8') as f:
+            json.dump(rules, f, ensure_ascii=False)
+        additions[name] = f"synthetic_{i}/"
+
+    with open(os.path.join(path, 'additions_list.json'), 'w', encoding='utf-8') as f:
+        json.dump(additions, f, ensure_ascii=False)
+    return list(additions)
+
+def child_pids(pid):
+    """Все потомки процесса (рендереры, GPU, расширения) по /proc"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+
+    found = []
+    stack = [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+def summarize(values):
+    """Минимум, медиана, 95-й перцентиль и максимум в миллисекундах"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 1),
+        'median_ms': round(statistics.median(ordered) * 1000, 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1)
+    }
+
+class Harness:
+    def __init__(self, browser_module, window, args):
+        self.main = browser_module
+        self.window = window
+        self.args = args
+        self.samples = []
+        self.load_latency = []
+        self.extension_latency = []
+        self.failed_loads = 0
+
+    def wait(self, ms):
+        """Крутит обычный цикл событий ms миллисекунд"""
+        loop = QEventLoop()
+        QTimer.singleShot(ms, loop.quit)
+        loop.exec()
+
+    def wait_until(self, predicate, timeout):
+        """Крутит цикл событий, пока predicate не вернет True или не выйдет timeout"""
+        if predicate():
+            return True
+        deadline = time.monotonic() + timeout
+        loop = QEventLoop()
+        poll = QTimer()
+        poll.timeout.connect(lambda: (predicate() or time.monotonic() >= deadline) and loop.quit())
+        poll.start(5)
+        loop.exec()
+        poll.stop()
+        return predicate()
+
+    def sample(self, phase):
+        """Снимок памяти, процессов и отзывчивости интерфейса"""
+        browser_stats = self.main.read_process_stats(os.getpid()) or {}
+        children = child_pids(os.getpid())
+        children_rss = sum((self.main.read_process_stats(pid) or {}).get('rss_kb', 0) for pid in children)
+        monitor = self.window.event_loop_monitor
+        self.samples.append({
+            'phase': phase,
+            'time_s': round(time.monotonic() - self.started, 2),
+            'tabs': self.window.tabs.count(),
+            'renderer_processes': len(self.window.renderer_pids()),
+            'child_processes': len(children),
+            'browser_rss_kb': browser_stats.get('rss_kb', 0),
+            'total_rss_kb': browser_stats.get('rss_kb', 0) + children_rss,
+            'event_loop_stalls': monitor.stalls,
+            'event_loop_lag_max_ms': round(monitor.lag_max * 1000, 1)
+        })
+
+    def open_tab(self, url):
+        """Открывает вкладку через add_new_tab и ждет окончания загрузки"""
+        started = time.monotonic()
+        self.window.add_new_tab(QUrl(url), "Нагрузка")
+        view = self.window.tabs.currentWidget()
+        result = []
+        view.loadFinished.connect(result.append)
+
+        if self.wait_until(lambda: result, self.args.load_timeout) and result[0]:
+            self.load_latency.append(time.monotonic() - started)
+        else:
+            self.failed_loads += 1
+
+    def close_tabs(self, keep):
+        """Закрывает вкладки с конца через close_current_tab"""
+        while self.window.tabs.count() > keep:
+            self.window.close_current_tab(self.window.tabs.count() - 1)
+
+    def start_extensions(self, names):
+        manager = self.window.extension_manager
+        for name in names:
+            started = time.monotonic()
+            manager.run_extension(name)
+            # Готовность - hello от процесса (при запуске по сокету его будит открытая вкладка)
+            if self.wait_until(lambda: name in manager.ports, self.args.load_timeout):
+                self.extension_latency.append(time.monotonic() - started)
+
+    def stop_extensions(self, names):
+        for name in names:
+            self.window.extension_manager.stop_extension(name)
+            self.window.extension_manager.ports.pop(name, None)
+
+    def type_url(self, text, predict):
+        """Набирает адрес по символу; textEdited испускается, только если предсказание включено"""
+        for length in range(1, len(text) + 1):
+            self.window.url_bar.setText(text[:length])
+            if predict:
+                self.window.url_bar.textEdited.emit(text[:length])
+            self.wait(self.args.char_ms)
+
+    def first_paint(self, condition, trial):
+        """Набирает адрес нового источника, жмет Enter и возвращает время до первой отрисовки"""
+        server = start_prediction_server(self.args.connect_delay_ms)
+        url = f"http://127.0.0.1:{server.server_address[1]}/page/{trial}"
+        if condition == 'prefetch':
+            # Адрес из истории - предсказатель уверен и грузит страницу в скрытой вкладке
+            self.window.history.record(QUrl(url))
+
+        view = self.window.tabs.currentWidget()
+        try:
+            self.type_url(url, condition != 'off')
+            self.wait(self.args.think_ms)
+
+            result = []
+            view.loadFinished.connect(result.append)
+            started = time.time()
+            self.window.navigate_to_url()
+            loaded = self.wait_until(lambda: result, self.args.load_timeout) and result[0]
+            view.loadFinished.disconnect(result.append)
+            if not loaded:
+                self.failed_loads += 1
+                return None, None
+            load_finished = time.time() - started
+
+            paint = []
+            view.page().runJavaScript(FIRST_PAINT_SCRIPT, 0, paint.append)
+            self.wait_until(lambda: paint, 5)
+            painted = paint[0] / 1000 - started if paint and paint[0] else None
+            return painted, load_finished
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def run_prediction(self):
+        self.started = time.monotonic()
+        self.wait_until(lambda: self.window.extension_manager.loader is None, 10)
+        # Спекулятивные загрузки ограничены в минуту; для замера лимит не должен срабатывать
+        self.window.predictor.max_loads_per_minute = self.args.trials + 1
+        self.window.add_new_tab(QUrl('about:blank'), "Предсказание")
+        self.wait(self.args.settle_ms)
+
+        conditions = ('off', 'preconnect', 'prefetch')
+        paint = {condition: [] for condition in conditions}
+        load = {condition: [] for condition in conditions}
+        # Условия чередуются в каждом замере, чтобы дрейф машины влиял на них одинаково
+        for trial in range(self.args.trials):
+            for condition in conditions:
+                painted, load_finished = self.first_paint(condition, trial)
+                if load_finished is not None:
+                    load[condition].append(load_finished)
+                if painted is not None:
+                    paint[condition].append(painted)
+
+        return {
+            'mode': 'prediction',
+            'trials': self.args.trials,
+            'connect_delay_ms': self.args.connect_delay_ms,
+            'char_ms': self.args.char_ms,
+            'think_ms': self.args.think_ms,
+            'revision': git_revision(),
+            'failed_loads': self.failed_loads,
+            'first_paint': {condition: summarize(values) for condition, values in paint.items()},
+            'load_finished': {condition: summarize(values) for condition, values in load.items()}
+        }
+
+    def run(self, base_url, extensions):
+        self.started = time.monotonic()
+        self.wait_until(lambda: self.window.extension_manager.loader is None, 10)
+        self.wait(self.args.settle_ms)
+        self.sample('start')
+
+        page = 0
+        for round_index in range(self.args.rounds):
+            for _ in range(self.args.tabs):
+                self.open_tab(f"{base_url}/page/{page}")
+                page += 1
+            self.wait(self.args.settle_ms)
+            self.sample(f"round {round_index + 1}: {self.args.tabs} tabs open")
+
+            self.start_extensions(extensions)
+            self.wait(self.args.settle_ms)
+            self.sample(f"round {round_index + 1}: extensions running")
+
+            self.stop_extensions(extensions)
+            self.close_tabs(1)
+            self.wait(self.args.settle_ms)
+            self.sample(f"round {round_index + 1}: closed")
+
+        monitor = self.window.event_loop_monitor
+        return {
+            'preset': self.args.preset,
+            'tabs': self.args.tabs,
+            'rounds': self.args.rounds,
+            'extensions': len(extensions),
+            'socket_activation': self.args.socket_activation,
+            'page_kb': self.args.page_kb,
+            'chromium_flags': os.environ.get('QTWEBENGINE_CHROMIUM_FLAGS', ''),
+            'revision': git_revision(),
+            'load_latency': summarize(self.load_latency),
+            'failed_loads': self.failed_loads,
+            'extension_start_latency': summarize(self.extension_latency),
+            'event_loop': {
+                'ticks': monitor.ticks,
+                'stalls': monitor.stalls,
+                'lag_max_ms': round(monitor.lag_max * 1000, 1),
+                'lag_mean_ms': round(monitor.lag_total / monitor.ticks * 1000, 2) if monitor.ticks else 0
+            },
+            'samples': self.samples
+        }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон браузера без экрана")
+    parser.add_argument('--tabs', type=int, default=20, help="сколько вкладок открывать за раунд")
+    parser.add_argument('--rounds', type=int, default=1, help="сколько раз открыть и закрыть вкладки")
+    parser.add_argument('--extensions', type=int, default=3, help="число синтетических расширений")
+    parser.add_argument('--socket-activation', action='store_true', help="расширения запускаются по подключению")
+    parser.add_argument('--preset', default='default', help="пресет процессов: default, economy, kiosk")
+    parser.add_argument('--page-kb', type=int, default=64, help="размер тестовой страницы")
+    parser.add_argument('--settle-ms', type=int, default=1000, help="пауза перед каждым снимком")
+    parser.add_argument('--load-timeout', type=float, default=30, help="таймаут загрузки, с")
+    parser.add_argument('--output', help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument('--mode', choices=('load', 'prediction'), default='load',
+                        help="load - вкладки и расширения, prediction - первая отрисовка с предсказанием и без")
+    parser.add_argument('--trials', type=int, default=10, help="замеров на каждое условие в режиме prediction")
+    parser.add_argument('--connect-delay-ms', type=int, default=150, help="цена нового соединения у тестового сервера")
+    parser.add_argument('--char-ms', type=int, default=120, help="пауза между символами при наборе адреса")
+    parser.add_argument('--think-ms', type=int, default=700, help="пауза между набором адреса и Enter")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    stub = start_stub_server(args.page_kb)
+    base_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    work_dir = tempfile.mkdtemp(prefix='toolsbrowser-harness-')
+    additions_path = os.path.join(work_dir, 'additions')
+    os.makedirs(additions_path)
+    extensions = create_additions(additions_path, args.extensions, args.socket_activation)
+    os.environ['ADDITIONS_PATH'] = additions_path
+
+    import main as browser_module
+    from PySide6.QtWidgets import QApplication
+
+    if args.preset not in browser_module.PROCESS_PRESETS:
+        print(f"Неизвестный пресет: {args.preset}", file=sys.stderr)
+        return 2
+
+    # Настройки пользователя не трогаем: пресет и домашняя страница только для прогона
+    settings = browser_module.load_settings()
+    settings.update({key: value for key, value in browser_module.PROCESS_PRESETS[args.preset].items() if key != 'label'})
+    settings.update({'preset': args.preset, 'home_page': f"{base_url}/home", 'download_dir': work_dir})
+    browser_module.apply_process_settings(settings)
+
+    app = QApplication(sys.argv)
+    # История, индекс страниц и профиль прогона не должны попадать в данные пользователя
+    window = browser_module.Browser(settings,
+                                    history_path=os.path.join(work_dir, 'history.json'),
+                                    index_path=os.path.join(work_dir, 'page_index.db'),
+                                    storage_path=os.path.join(work_dir, 'profile'))
+    window.show()
+
+    harness = Harness(browser_module, window, args)
+    if args.mode == 'prediction':
+        result = harness.run_prediction()
+    else:
+        result = harness.run(base_url, extensions)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    window.close()
+    # Обычный выход через цикл событий: срабатывают обработчики aboutToQuit
+    # (остановка расширений, сохранение истории, закрытие индекса)
+    QTimer.singleShot(0, app.quit)
+    app.exec()
+    stub.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
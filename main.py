@@ -1,18 +1,1123 @@
 import sys
 import os
 import json
+import time
+import signal
+import socket
+import struct
+import tempfile
+import itertools
+import re
+import pickle
+import queue
+import sqlite3
+import hashlib
+import zipfile
 import subprocess
+import threading
+from collections import Counter, deque
 from pathlib import Path
-from PySide6.QtCore import QUrl, Qt, QSize, QPropertyAnimation, QEasingCurve, QProcess, Signal, QProcessEnvironment
+from PySide6.QtCore import (QUrl, Qt, QSize, QPropertyAnimation, QEasingCurve, QProcess, Signal,
+                            QProcessEnvironment, QObject, QRunnable, QThreadPool, QTimer, QCoreApplication,
+                            QStandardPaths, QSocketNotifier)
 from PySide6.QtWidgets import (QApplication, QMainWindow, QLineEdit, QToolBar, 
                                QPushButton, QWidget, QVBoxLayout, QHBoxLayout, 
                                QFrame, QLabel, QTabWidget, QStyle, QScrollArea,
                                QTextEdit, QSplitter, QSizePolicy, QMenu, QDialog,
-                               QDialogButtonBox, QFormLayout, QComboBox)
+                               QDialogButtonBox, QFormLayout, QComboBox, QSpinBox,
+                               QCheckBox, QMessageBox, QProgressBar, QListWidget,
+                               QListWidgetItem)
 from PySide6.QtWebEngineWidgets import QWebEngineView
-from PySide6.QtWebEngineCore import QWebEngineSettings
+from PySide6.QtWebEngineCore import (QWebEngineSettings, QWebEngineProfile, QWebEnginePage, QWebEngineDownloadRequest,
+                                     QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo)
+from PySide6.QtNetwork import QLocalServer
 from PySide6.QtGui import QIcon, QPalette, QColor, QFont, QAction, QKeySequence
 
+PROCESS_PRESETS = {
+    'default': {
+        'label': 'По умолчанию',
+        'process_model': 'site-instance',
+        'renderer_limit': 0,
+        'software_rendering': False,
+        'cache_type': 'disk',
+        'cache_size_mb': 0
+    },
+    'economy': {
+        'label': 'Экономия памяти',
+        'process_model': 'site',
+        'renderer_limit': 4,
+        'software_rendering': False,
+        'cache_type': 'disk',
+        'cache_size_mb': 100
+    },
+    'kiosk': {
+        'label': 'Киоск без GPU',
+        'process_model': 'site',
+        'renderer_limit': 2,
+        'software_rendering': True,
+        'cache_type': 'memory',
+        'cache_size_mb': 50
+    }
+}
+
+PROCESS_MODELS = {
+    'site-instance': 'Процесс на экземпляр сайта',
+    'site': 'Процесс на сайт',
+    'single': 'Один процесс'
+}
+
+CACHE_TYPES = {
+    'disk': ('На диске', QWebEngineProfile.DiskHttpCache),
+    'memory': ('В памяти', QWebEngineProfile.MemoryHttpCache),
+    'none': ('Отключен', QWebEngineProfile.NoCache)
+}
+
+def get_settings_path():
+    """Возвращает путь к settings.json рядом со скриптом"""
+    return Path(__file__).parent.absolute() / "settings.json"
+
+def load_settings():
+    """Загружает настройки браузера, недостающие поля берутся из пресета"""
+    settings = {
+        'preset': 'default',
+        'home_page': 'https://ya.ru',
+        'download_dir': QStandardPaths.writableLocation(QStandardPaths.DownloadLocation),
+        'max_downloads': 3,
+        'download_limit_kb': 0
+    }
+    try:
+        settings_path = get_settings_path()
+        if settings_path.exists():
+            with open(settings_path, 'r', encoding='utf-8') as f:
+                settings.update(json.load(f))
+    except Exception as e:
+        print(f"Ошибка загрузки настроек: {e}")
+    
+    preset = PROCESS_PRESETS.get(settings['preset'], PROCESS_PRESETS['default'])
+    for key, value in preset.items():
+        if key != 'label':
+            settings.setdefault(key, value)
+    return settings
+
+def save_settings(settings):
+    """Сохраняет настройки браузера"""
+    with open(get_settings_path(), 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+def chromium_flags(settings):
+    """Флаги Chromium для модели процессов и рендеринга"""
+    flags = []
+    if settings['process_model'] == 'site':
+        flags.append('--process-per-site')
+    elif settings['process_model'] == 'single':
+        flags.append('--single-process')
+    if settings['renderer_limit'] > 0:
+        flags.append(f"--renderer-process-limit={settings['renderer_limit']}")
+    if settings['software_rendering']:
+        flags.extend(['--disable-gpu', '--disable-gpu-compositing'])
+    return flags
+
+def apply_process_settings(settings):
+    """Применяет настройки процессов; вызывать до создания QApplication"""
+    flags = chromium_flags(settings)
+    if flags:
+        existing = os.environ.get('QTWEBENGINE_CHROMIUM_FLAGS', '')
+        os.environ['QTWEBENGINE_CHROMIUM_FLAGS'] = ' '.join(filter(None, [existing] + flags))
+    if settings['software_rendering']:
+        QCoreApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)
+
+def configure_profile(profile, settings):
+    """Применяет настройки кэша к профилю вкладок"""
+    profile.setHttpCacheType(CACHE_TYPES.get(settings['cache_type'], CACHE_TYPES['disk'])[1])
+    profile.setHttpCacheMaximumSize(settings['cache_size_mb'] * 1024 * 1024)
+
+class SettingsDialog(QDialog):
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.settings = dict(settings)
+        self.setWindowTitle("Настройки")
+        self.setGeometry(200, 200, 450, 300)
+        
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+        
+        self.preset_combo = QComboBox()
+        for key, preset in PROCESS_PRESETS.items():
+            self.preset_combo.addItem(preset['label'], key)
+        self.preset_combo.setCurrentIndex(max(0, self.preset_combo.findData(self.settings['preset'])))
+        self.preset_combo.currentIndexChanged.connect(self.apply_preset)
+        form_layout.addRow("Пресет:", self.preset_combo)
+        
+        self.process_model_combo = QComboBox()
+        for key, label in PROCESS_MODELS.items():
+            self.process_model_combo.addItem(label, key)
+        form_layout.addRow("Модель процессов:", self.process_model_combo)
+        
+        self.renderer_limit_spin = QSpinBox()
+        self.renderer_limit_spin.setRange(0, 64)
+        self.renderer_limit_spin.setSpecialValueText("Без ограничения")
+        form_layout.addRow("Макс. процессов отрисовки:", self.renderer_limit_spin)
+        
+        self.software_rendering_check = QCheckBox("Программная отрисовка (без GPU)")
+        form_layout.addRow("", self.software_rendering_check)
+        
+        self.cache_type_combo = QComboBox()
+        for key, (label, _) in CACHE_TYPES.items():
+            self.cache_type_combo.addItem(label, key)
+        form_layout.addRow("HTTP кэш:", self.cache_type_combo)
+        
+        self.cache_size_spin = QSpinBox()
+        self.cache_size_spin.setRange(0, 10240)
+        self.cache_size_spin.setSuffix(" МБ")
+        self.cache_size_spin.setSpecialValueText("Автоматически")
+        form_layout.addRow("Размер кэша:", self.cache_size_spin)
+        
+        self.max_downloads_spin = QSpinBox()
+        self.max_downloads_spin.setRange(1, 20)
+        self.max_downloads_spin.setValue(self.settings['max_downloads'])
+        form_layout.addRow("Одновременных загрузок:", self.max_downloads_spin)
+        
+        self.download_limit_spin = QSpinBox()
+        self.download_limit_spin.setRange(0, 1024 * 1024)
+        self.download_limit_spin.setSuffix(" КБ/с")
+        self.download_limit_spin.setSpecialValueText("Без ограничения")
+        self.download_limit_spin.setValue(self.settings['download_limit_kb'])
+        form_layout.addRow("Скорость загрузок:", self.download_limit_spin)
+        
+        layout.addLayout(form_layout)
+        
+        note_label = QLabel("Модель процессов и отрисовка применяются после перезапуска браузера")
+        note_label.setStyleSheet("color: #999; font-size: 10px;")
+        note_label.setWordWrap(True)
+        layout.addWidget(note_label)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.show_settings(self.settings)
+    
+    def apply_preset(self):
+        """Заполняет поля значениями выбранного пресета"""
+        self.show_settings(PROCESS_PRESETS[self.preset_combo.currentData()])
+    
+    def show_settings(self, settings):
+        self.process_model_combo.setCurrentIndex(max(0, self.process_model_combo.findData(settings['process_model'])))
+        self.renderer_limit_spin.setValue(settings['renderer_limit'])
+        self.software_rendering_check.setChecked(settings['software_rendering'])
+        self.cache_type_combo.setCurrentIndex(max(0, self.cache_type_combo.findData(settings['cache_type'])))
+        self.cache_size_spin.setValue(settings['cache_size_mb'])
+    
+    def get_settings(self):
+        """Возвращает настройки из полей диалога"""
+        self.settings.update({
+            'preset': self.preset_combo.currentData(),
+            'process_model': self.process_model_combo.currentData(),
+            'renderer_limit': self.renderer_limit_spin.value(),
+            'software_rendering': self.software_rendering_check.isChecked(),
+            'cache_type': self.cache_type_combo.currentData(),
+            'cache_size_mb': self.cache_size_spin.value(),
+            'max_downloads': self.max_downloads_spin.value(),
+            'download_limit_kb': self.download_limit_spin.value()
+        })
+        return self.settings
+
+class VisitHistory:
+    """Счетчики посещений по адресам для предсказания следующей страницы"""
+    def __init__(self, path):
+        self.path = path
+        self.visits = Counter()
+        self.unsaved = 0
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.visits.update(json.load(f))
+        except Exception as e:
+            print(f"Ошибка загрузки истории: {e}")
+    
+    def record(self, qurl):
+        """Учитывает посещение http(s) страницы"""
+        if qurl.scheme() not in ('http', 'https'):
+            return
+        self.visits[qurl.toString().split('#', 1)[0]] += 1
+        self.unsaved += 1
+        if self.unsaved >= 10:
+            self.save()
+    
+    def save(self):
+        if not self.unsaved:
+            return
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self.visits.most_common(1000)), f, ensure_ascii=False)
+            self.unsaved = 0
+        except Exception as e:
+            print(f"Ошибка сохранения истории: {e}")
+    
+    def most_visited(self, count):
+        return [url for url, _ in self.visits.most_common(count)]
+    
+    def match(self, text):
+        """Самый посещаемый адрес, который начинается с введенного текста"""
+        text = text.lower()
+        for url, _ in self.visits.most_common():
+            host_and_path = url.split('://', 1)[-1]
+            if host_and_path.startswith(text) or host_and_path.startswith('www.' + text) or url.startswith(text):
+                return url
+        return None
+
+class Predictor(QObject):
+    """Заранее соединяется с сайтами и прогревает страницы, которые пользователь, вероятно, откроет"""
+    def __init__(self, profile, history, open_urls, parent=None):
+        super().__init__(parent)
+        self.history = history
+        # Адреса, уже открытые во вкладках: их прогревать незачем
+        self.open_urls = open_urls
+        # Скрытая страница в том же профиле прогревает DNS, соединения и HTTP кэш Chromium
+        self.page = QWebEnginePage(profile, self)
+        self.page.loadFinished.connect(self.on_prefetch_finished)
+        # Подсказки preconnect: имя разрешает и TCP/TLS соединение открывает сам Chromium,
+        # в своем сетевом процессе и без загрузки страницы
+        self.hints_page = QWebEnginePage(profile, self)
+        self.prefetching = None
+        self.queue = deque()
+        self.recent_loads = deque()
+        self.recent_origins = {}
+        self.max_loads_per_minute = 6
+        self.typed_text = ''
+        
+        self.preconnect_timer = QTimer(self)
+        self.preconnect_timer.setSingleShot(True)
+        self.preconnect_timer.setInterval(150)
+        self.preconnect_timer.timeout.connect(self.preconnect_typed)
+        
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(600)
+        self.prefetch_timer.timeout.connect(self.prefetch_typed)
+    
+    def on_text_edited(self, text):
+        self.typed_text = text.strip()
+        self.preconnect_timer.start()
+        self.prefetch_timer.start()
+    
+    def candidate(self, text):
+        """Лучший кандидат для введенного текста и признак уверенности"""
+        if not text or ' ' in text:
+            return None, False
+        url = self.history.match(text)
+        if url:
+            return url, True
+        if '.' in text and not os.path.exists(text):
+            return text if text.startswith(('http://', 'https://')) else 'https://' + text, False
+        return None, False
+    
+    def preconnect_typed(self):
+        url, _ = self.candidate(self.typed_text)
+        if url:
+            self.preconnect([url])
+    
+    def preconnect(self, urls):
+        """Просит Chromium заранее соединиться с источниками адресов"""
+        now = time.monotonic()
+        if len(self.recent_origins) > 100:
+            self.recent_origins = {origin: at for origin, at in self.recent_origins.items() if now - at < 60}
+        
+        origins = []
+        for url in urls:
+            url = QUrl(url)
+            if url.scheme() not in ('http', 'https') or not url.host():
+                continue
+            origin = QUrl()
+            origin.setScheme(url.scheme())
+            origin.setHost(url.host())
+            origin.setPort(url.port())
+            # toEncoded экранирует кавычки и угловые скобки, адрес можно вставить в разметку
+            origin = origin.toEncoded().data().decode()
+            if now - self.recent_origins.get(origin, -60) < 60:
+                continue
+            self.recent_origins[origin] = now
+            origins.append(origin)
+        
+        if origins:
+            links = ''.join(f'<link rel="dns-prefetch" href="{origin}"><link rel="preconnect" href="{origin}">'
+                            for origin in origins)
+            self.hints_page.setHtml(f'<!DOCTYPE html><html><head>{links}</head></html>')
+    
+    def prefetch_typed(self):
+        # Страницу грузим заранее только для адресов из истории, для остальных хватит preconnect
+        url, confident = self.candidate(self.typed_text)
+        if url and confident:
+            self.queue.appendleft(url)
+            self.process_queue()
+    
+    @staticmethod
+    def normalized(url):
+        return QUrl(url).toString().partition('#')[0].rstrip('/')
+    
+    def is_open(self, url):
+        return self.normalized(url) in {self.normalized(opened) for opened in self.open_urls()}
+    
+    def warm_up(self, urls):
+        """Ставит в очередь фонового прогрева адреса, которые еще не открыты во вкладках"""
+        urls = [url for url in urls if not self.is_open(url)]
+        self.preconnect(urls)
+        for url in urls:
+            if url not in self.queue:
+                self.queue.append(url)
+        self.process_queue()
+    
+    def allow_load(self):
+        """Ограничивает число спекулятивных загрузок в минуту"""
+        now = time.monotonic()
+        while self.recent_loads and now - self.recent_loads[0] > 60:
+            self.recent_loads.popleft()
+        return len(self.recent_loads) < self.max_loads_per_minute
+    
+    def process_queue(self):
+        # Пока адрес ждал в очереди, его могли открыть во вкладке
+        while self.queue and self.is_open(self.queue[0]):
+            self.queue.popleft()
+        if self.prefetching or not self.queue or not self.allow_load():
+            return
+        
+        self.prefetching = self.queue.popleft()
+        self.recent_loads.append(time.monotonic())
+        self.page.setUrl(QUrl(self.prefetching))
+    
+    def on_prefetch_finished(self, ok):
+        if not self.prefetching or self.page.url().scheme() == 'about':
+            return
+        
+        self.prefetching = None
+        self.process_queue()
+        if not self.prefetching:
+            # Освобождаем процесс отрисовки, кэш и соединения остаются в профиле
+            self.page.setUrl(QUrl("about:blank"))
+
+class PageIndex:
+    """Полнотекстовый индекс посещенных страниц в SQLite FTS5
+    
+    Текст хранится в FTS-таблице page_text, адрес, время посещения и хэш
+    текста - в pages с тем же rowid. Размер ограничен возрастом записей
+    и их числом: самые давние посещения вытесняются первыми.
+    """
+    MAX_TEXT = 200 * 1024
+    
+    def __init__(self, path, max_pages=50000, max_age_days=90):
+        self.path = str(path)
+        self.max_pages = max_pages
+        self.max_age = max_age_days * 24 * 3600
+        self.local = threading.local()
+        self.inserted = 0
+        
+        conn = self.connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE NOT NULL,
+                title TEXT,
+                digest TEXT,
+                visited_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_visited_at ON pages(visited_at);
+            CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(title, body, tokenize='unicode61 remove_diacritics 2');
+        """)
+        conn.commit()
+    
+    def connect(self):
+        """Отдельное соединение на поток: запись идет из фонового потока, поиск из окна"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def add(self, url, title, text, visited_at):
+        """Индексирует страницу; неизменившийся текст только обновляет время посещения"""
+        text = text[:self.MAX_TEXT]
+        digest = hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()
+        conn = self.connect()
+        with conn:
+            row = conn.execute("SELECT id, digest FROM pages WHERE url = ?", (url,)).fetchone()
+            if row and row[1] == digest:
+                conn.execute("UPDATE pages SET visited_at = ?, title = ? WHERE id = ?", (visited_at, title, row[0]))
+                return False
+            
+            if row:
+                conn.execute("DELETE FROM page_text WHERE rowid = ?", (row[0],))
+                conn.execute("UPDATE pages SET title = ?, digest = ?, visited_at = ? WHERE id = ?",
+                             (title, digest, visited_at, row[0]))
+                page_id = row[0]
+            else:
+                page_id = conn.execute("INSERT INTO pages (url, title, digest, visited_at) VALUES (?, ?, ?, ?)",
+                                       (url, title, digest, visited_at)).lastrowid
+            conn.execute("INSERT INTO page_text (rowid, title, body) VALUES (?, ?, ?)", (page_id, title, text))
+        
+        self.inserted += 1
+        if self.inserted % 500 == 0:
+            self.evict()
+        return True
+    
+    def evict(self):
+        """Удаляет старые записи и записи сверх max_pages, затем сливает сегменты FTS"""
+        conn = self.connect()
+        with conn:
+            expired = conn.execute("""
+                SELECT id FROM pages WHERE visited_at < ?
+                OR id IN (SELECT id FROM pages ORDER BY visited_at DESC LIMIT -1 OFFSET ?)
+            """, (time.time() - self.max_age, self.max_pages)).fetchall()
+            conn.executemany("DELETE FROM page_text WHERE rowid = ?", expired)
+            conn.executemany("DELETE FROM pages WHERE id = ?", expired)
+            if expired:
+                conn.execute("INSERT INTO page_text(page_text) VALUES ('optimize')")
+        return len(expired)
+    
+    @staticmethod
+    def build_query(text):
+        """Запрос FTS5 из введенного текста: все слова, последнее - как префикс"""
+        words = re.findall(r'\w+', text)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+    
+    def search(self, text, limit=50):
+        """Страницы по релевантности bm25 (совпадения в заголовке весят больше)"""
+        query = self.build_query(text)
+        if query is None:
+            return []
+        rows = self.connect().execute("""
+            SELECT pages.url, pages.title, snippet(page_text, 1, '', '', '…', 16), pages.visited_at
+            FROM page_text JOIN pages ON pages.id = page_text.rowid
+            WHERE page_text MATCH ?
+            ORDER BY bm25(page_text, 5.0, 1.0)
+            LIMIT ?
+        """, (query, limit)).fetchall()
+        return [{'url': url, 'title': title, 'snippet': snippet, 'visited_at': visited_at}
+                for url, title, snippet, visited_at in rows]
+
+class PageIndexer(QObject):
+    """Собирает текст загруженных вкладок и пишет его в PageIndex в фоновом потоке
+    
+    Текст страницы запрашивается не сразу после loadFinished, а по таймеру
+    по одной вкладке за раз, чтобы не мешать загрузке. Очередь записи
+    ограничена: при переполнении страница просто не индексируется.
+    """
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.index = PageIndex(path)
+        self.pending = {}
+        self.queue = queue.Queue(maxsize=100)
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(1500)
+        self.timer.timeout.connect(self.collect_next)
+        
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.close)
+    
+    def page_loaded(self, view):
+        """Ставит вкладку в очередь на индексирование после загрузки"""
+        if view.url().scheme() not in ('http', 'https'):
+            return
+        self.pending[id(view)] = view
+        if not self.timer.isActive():
+            self.timer.start()
+    
+    def collect_next(self):
+        if not self.pending:
+            self.timer.stop()
+            return
+        
+        view = self.pending.pop(next(iter(self.pending)))
+        try:
+            url = view.url().toString().split('#', 1)[0]
+            title = view.page().title()
+            view.page().toPlainText(lambda text: self.enqueue(url, title, text))
+        except RuntimeError:
+            # Вкладку уже удалили
+            pass
+    
+    def enqueue(self, url, title, text):
+        if not text.strip():
+            return
+        try:
+            self.queue.put_nowait((url, title, text, time.time()))
+        except queue.Full:
+            pass
+    
+    def run(self):
+        try:
+            self.index.evict()
+        except sqlite3.Error as e:
+            print(f"Ошибка очистки индекса страниц: {e}")
+        
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.index.add(*item)
+            except sqlite3.Error as e:
+                print(f"Ошибка индексирования страницы: {e}")
+    
+    def search(self, text, limit=50):
+        try:
+            return self.index.search(text, limit)
+        except sqlite3.Error as e:
+            print(f"Ошибка поиска: {e}")
+            return []
+    
+    def close(self):
+        self.timer.stop()
+        self.pending.clear()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+class DownloadManager(QObject):
+    """Загрузки со страниц: очередь с ограничением числа и скорости, пауза и продолжение"""
+    download_added = Signal(object)
+    download_updated = Signal(object)
+    download_finished = Signal(object)
+    
+    def __init__(self, profile, settings, parent=None):
+        super().__init__(parent)
+        self.downloads = []
+        self.user_paused = set()
+        self.throttled = False
+        
+        # Ограничение скорости: раз в 250 мс сравниваем скачанное с разрешенным
+        self.allowance = 0.0
+        self.last_received = 0
+        self.last_tick = time.monotonic()
+        self.throttle_timer = QTimer(self)
+        self.throttle_timer.setInterval(250)
+        self.throttle_timer.timeout.connect(self.throttle)
+        
+        self.apply_settings(settings)
+        profile.downloadRequested.connect(self.on_download_requested)
+    
+    def apply_settings(self, settings):
+        self.directory = settings['download_dir']
+        self.max_active = max(1, settings['max_downloads'])
+        self.bandwidth_limit = settings['download_limit_kb'] * 1024
+        if self.throttled and not self.bandwidth_limit:
+            self.throttled = False
+        self.schedule()
+    
+    def on_download_requested(self, download):
+        if self.directory:
+            download.setDownloadDirectory(self.directory)
+        download.accept()
+        
+        download.receivedBytesChanged.connect(lambda download=download: self.download_updated.emit(download))
+        download.isPausedChanged.connect(lambda download=download: self.download_updated.emit(download))
+        download.stateChanged.connect(lambda _, download=download: self.on_state_changed(download))
+        
+        self.downloads.append(download)
+        self.schedule()
+        self.download_added.emit(download)
+    
+    def on_state_changed(self, download):
+        self.download_updated.emit(download)
+        if download.isFinished():
+            self.schedule()
+            if download.state() == QWebEngineDownloadRequest.DownloadCompleted:
+                self.download_finished.emit(download)
+    
+    def schedule(self):
+        """Оставляет активными не больше max_active загрузок, остальные ставит на паузу"""
+        waiting = [d for d in self.downloads if not d.isFinished() and d.id() not in self.user_paused]
+        for index, download in enumerate(waiting):
+            should_run = index < self.max_active and not self.throttled
+            if should_run and download.isPaused():
+                download.resume()
+            elif not should_run and not download.isPaused():
+                download.pause()
+        
+        if self.bandwidth_limit and waiting:
+            if not self.throttle_timer.isActive():
+                self.last_received = self.total_received()
+                self.last_tick = time.monotonic()
+                self.throttle_timer.start()
+        else:
+            self.throttle_timer.stop()
+    
+    def total_received(self):
+        return sum(d.receivedBytes() for d in self.downloads)
+    
+    def throttle(self):
+        now = time.monotonic()
+        received = self.total_received()
+        self.allowance = min(self.allowance + self.bandwidth_limit * (now - self.last_tick), self.bandwidth_limit)
+        self.allowance -= received - self.last_received
+        self.last_received, self.last_tick = received, now
+        
+        throttled = self.allowance < 0
+        if throttled != self.throttled:
+            self.throttled = throttled
+            self.schedule()
+    
+    def toggle_pause(self, download):
+        """Пауза/продолжение по просьбе пользователя"""
+        if download.id() in self.user_paused:
+            self.user_paused.discard(download.id())
+        else:
+            self.user_paused.add(download.id())
+            download.pause()
+        self.schedule()
+    
+    def cancel(self, download):
+        self.user_paused.discard(download.id())
+        download.cancel()
+    
+    def active_count(self):
+        return sum(1 for d in self.downloads if not d.isFinished())
+
+class DownloadsDialog(QDialog):
+    STATE_TEXT = {
+        QWebEngineDownloadRequest.DownloadCompleted: "Готово",
+        QWebEngineDownloadRequest.DownloadCancelled: "Отменено",
+        QWebEngineDownloadRequest.DownloadInterrupted: "Прервано"
+    }
+    
+    def __init__(self, download_manager, parent=None):
+        super().__init__(parent)
+        self.download_manager = download_manager
+        self.rows = {}
+        self.setWindowTitle("Загрузки")
+        self.setGeometry(200, 200, 600, 400)
+        
+        layout = QVBoxLayout(self)
+        
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        content = QWidget()
+        self.content_layout = QVBoxLayout(content)
+        self.content_layout.setAlignment(Qt.AlignTop)
+        scroll.setWidget(content)
+        layout.addWidget(scroll)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        for download in download_manager.downloads:
+            self.add_row(download)
+        download_manager.download_added.connect(self.add_row)
+        download_manager.download_updated.connect(self.update_row)
+    
+    def add_row(self, download):
+        row = QFrame()
+        row.setStyleSheet("""
+            QFrame {
+                background-color: #2d2d2d;
+                border-radius: 6px;
+            }
+        """)
+        row_layout = QHBoxLayout(row)
+        
+        info_widget = QWidget()
+        info_layout = QVBoxLayout(info_widget)
+        info_layout.setContentsMargins(0, 0, 0, 0)
+        
+        name_label = QLabel(download.downloadFileName())
+        name_label.setStyleSheet("color: white;")
+        info_layout.addWidget(name_label)
+        
+        progress = QProgressBar()
+        progress.setFixedHeight(12)
+        progress.setTextVisible(False)
+        info_layout.addWidget(progress)
+        
+        status_label = QLabel()
+        status_label.setStyleSheet("color: #999; font-size: 10px;")
+        info_layout.addWidget(status_label)
+        
+        row_layout.addWidget(info_widget, 1)
+        
+        pause_btn = QPushButton()
+        pause_btn.setFixedSize(30, 30)
+        pause_btn.clicked.connect(lambda: self.download_manager.toggle_pause(download))
+        row_layout.addWidget(pause_btn)
+        
+        cancel_btn = QPushButton("✕")
+        cancel_btn.setFixedSize(30, 30)
+        cancel_btn.clicked.connect(lambda: self.download_manager.cancel(download))
+        row_layout.addWidget(cancel_btn)
+        
+        self.content_layout.addWidget(row)
+        self.rows[download.id()] = (progress, status_label, pause_btn, cancel_btn)
+        self.update_row(download)
+    
+    def update_row(self, download):
+        if download.id() not in self.rows:
+            return
+        progress, status_label, pause_btn, cancel_btn = self.rows[download.id()]
+        
+        received = download.receivedBytes() / 1024 / 1024
+        total = download.totalBytes()
+        if total > 0:
+            progress.setRange(0, 1000)
+            progress.setValue(int(download.receivedBytes() * 1000 / total))
+            status = f"{received:.1f} из {total / 1024 / 1024:.1f} МБ"
+        else:
+            progress.setRange(0, 0)
+            status = f"{received:.1f} МБ"
+        
+        if download.isFinished():
+            progress.setRange(0, 1)
+            progress.setValue(1)
+            status = self.STATE_TEXT.get(download.state(), status)
+            if download.state() == QWebEngineDownloadRequest.DownloadInterrupted:
+                status += f": {download.interruptReasonString()}"
+        elif download.id() in self.download_manager.user_paused:
+            status += " - пауза"
+        elif download.isPaused():
+            status += " - в очереди"
+        
+        status_label.setText(status)
+        pause_btn.setText("▶" if download.id() in self.download_manager.user_paused else "⏸")
+        pause_btn.setEnabled(not download.isFinished())
+        cancel_btn.setEnabled(not download.isFinished())
+
+class SearchDialog(QDialog):
+    """Поиск по тексту посещенных страниц"""
+    def __init__(self, indexer, parent=None):
+        super().__init__(parent)
+        self.indexer = indexer
+        self.setWindowTitle("Поиск по истории")
+        self.setGeometry(200, 200, 700, 500)
+        
+        layout = QVBoxLayout(self)
+        
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Слова со страницы, которую вы видели...")
+        self.query_edit.textChanged.connect(lambda: self.search_timer.start())
+        layout.addWidget(self.query_edit)
+        
+        self.results_list = QListWidget()
+        self.results_list.setWordWrap(True)
+        self.results_list.itemActivated.connect(self.open_result)
+        layout.addWidget(self.results_list)
+        
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: #999; font-size: 10px;")
+        layout.addWidget(self.status_label)
+        
+        # Ищем, когда пользователь перестал печатать
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+    
+    def run_search(self):
+        started = time.perf_counter()
+        results = self.indexer.search(self.query_edit.text())
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        self.results_list.clear()
+        for result in results:
+            item = QListWidgetItem(f"{result['title'] or result['url']}\n{result['url']}\n{result['snippet']}")
+            item.setData(Qt.UserRole, result['url'])
+            self.results_list.addItem(item)
+        self.status_label.setText(f"Найдено: {len(results)} за {elapsed:.1f} мс" if self.query_edit.text().strip() else "")
+    
+    def open_result(self, item):
+        self.parent().add_new_tab(QUrl(item.data(Qt.UserRole)), item.text().split('\n', 1)[0][:15])
+        self.hide()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+def read_archive_rules(path):
+    """rules.json из корня zip-архива или None, если это не расширение"""
+    try:
+        with zipfile.ZipFile(path) as zip_ref:
+            with zip_ref.open('rules.json') as f:
+                rules = json.load(f)
+        return rules if isinstance(rules, dict) else None
+    except (KeyError, OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+class FilterRules:
+    """Скомпилированные правила блокировки: множества доменов и автомат Ахо-Корасик по подстрокам URL"""
+    FORMAT_VERSION = 3
+    # Шаблон из одной схемы ("https://") совпал бы с любым адресом
+    SCHEME_ONLY = re.compile(r'[a-z][a-z0-9+.-]*:/*|:/*')
+    
+    def __init__(self, data=None):
+        data = data or {}
+        self.domains = data.get('domains', set())
+        self.exception_domains = data.get('exception_domains', set())
+        # Переходы автомата по байтам UTF-8: ключ (состояние << 8) | байт -> новое состояние
+        self.goto = data.get('goto', {})
+        self.fail = data.get('fail', [0])
+        # Состояния, где заканчивается правило без '*', и правила с '*' для дополнительной проверки
+        self.exact = data.get('exact', b'\x00')
+        self.partial = data.get('partial', {})
+        self.wildcards = data.get('wildcards', [])
+        self.compiled_wildcards = {}
+    
+    @classmethod
+    def parse(cls, lines):
+        """Разбирает строки списков в формате Adblock или hosts"""
+        domains, exception_domains, patterns = set(), set(), set()
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(('!', '[', '#')) or '##' in line or '#@#' in line:
+                continue
+            
+            exception = line.startswith('@@')
+            if exception:
+                line = line[2:]
+            
+            # Регулярные выражения не поддерживаются
+            if len(line) > 2 and line.startswith('/') and line.endswith('/'):
+                continue
+            # Опции ($third-party, $domain=, $script...) сужают правило, а проверить их здесь
+            # нельзя. Без них правило блокировало бы лишнее, поэтому пропускаем его целиком.
+            # Исключение с опциями оставляем: оно может только разрешить лишнее.
+            line, has_options, _ = line.partition('$')
+            if has_options and not exception:
+                continue
+            line = line.lower()
+            
+            # hosts: "0.0.0.0 example.com"
+            parts = line.split()
+            if len(parts) == 2 and parts[0] in ('0.0.0.0', '127.0.0.1', '::1'):
+                line = '||' + parts[1] + '^'
+            
+            if line.startswith('||') and re.fullmatch(r'\|\|[a-z0-9.-]+\^?', line):
+                (exception_domains if exception else domains).add(line[2:].rstrip('^'))
+            elif not exception:
+                pattern = line.strip('|').replace('^', '')
+                if len(pattern.replace('*', '')) >= 3 and not cls.SCHEME_ONLY.fullmatch(pattern.strip('*')):
+                    patterns.add(pattern)
+        
+        return cls.compile(domains, exception_domains, patterns)
+    
+    @staticmethod
+    def wildcard_keyword(pattern, piece_counts):
+        """Кусок шаблона с '*' для автомата: самый редкий среди всех шаблонов, при равенстве самый длинный
+        
+        Шаблоны с общим куском ("/ad1/*/pixel.gif", "/ad2/*/pixel.gif"...) иначе
+        собрались бы в одном состоянии, и каждое попадание в него проверяло бы
+        все их регулярные выражения в потоке интерфейса. Куски короче трех
+        символов берутся, только если других нет: они встречаются почти везде.
+        """
+        pieces = [piece for piece in pattern.split('*') if piece]
+        return min(pieces, key=lambda piece: (len(piece) < 3, piece_counts[piece], -len(piece)))
+    
+    @classmethod
+    def compile(cls, domains, exception_domains, patterns):
+        goto, fail, exact, partial, wildcards = {}, [0], bytearray(b'\x00'), {}, []
+        piece_counts = Counter(
+            piece for pattern in patterns if '*' in pattern for piece in set(pattern.split('*'))
+        )
+        
+        def add_keyword(keyword):
+            state = 0
+            for code in keyword.encode('utf-8'):
+                key = (state << 8) | code
+                if key not in goto:
+                    goto[key] = len(fail)
+                    fail.append(0)
+                    exact.append(0)
+                state = goto[key]
+            return state
+        
+        for pattern in sorted(patterns):
+            if '*' in pattern:
+                # Автомат ищет один кусок без '*', остальное проверяется регулярным выражением
+                state = add_keyword(cls.wildcard_keyword(pattern, piece_counts))
+                partial.setdefault(state, []).append(len(wildcards))
+                wildcards.append(pattern)
+            else:
+                exact[add_keyword(pattern)] = 1
+        
+        # Ссылки неудачи строятся обходом в ширину
+        children = {}
+        for key, child in goto.items():
+            children.setdefault(key >> 8, []).append((key & 0xFF, child))
+        queue = deque(child for _, child in children.get(0, []))
+        while queue:
+            state = queue.popleft()
+            for code, child in children.get(state, []):
+                fallback = fail[state]
+                while fallback and ((fallback << 8) | code) not in goto:
+                    fallback = fail[fallback]
+                target = goto.get((fallback << 8) | code, 0)
+                fail[child] = target if target != child else 0
+                exact[child] |= exact[fail[child]]
+                if fail[child] in partial:
+                    partial.setdefault(child, [])
+                    partial[child] = partial[child] + partial[fail[child]]
+                queue.append(child)
+        
+        return cls({
+            'domains': domains,
+            'exception_domains': exception_domains,
+            'goto': goto,
+            'fail': fail,
+            'exact': bytes(exact),
+            'partial': {state: tuple(ids) for state, ids in partial.items()},
+            'wildcards': wildcards
+        })
+    
+    def to_data(self):
+        return {
+            'domains': self.domains,
+            'exception_domains': self.exception_domains,
+            'goto': self.goto,
+            'fail': self.fail,
+            'exact': self.exact,
+            'partial': self.partial,
+            'wildcards': self.wildcards
+        }
+    
+    @staticmethod
+    def host_in(host, domains):
+        """Проверяет домен и все его родительские домены"""
+        while host:
+            if host in domains:
+                return True
+            host = host.partition('.')[2]
+        return False
+    
+    def matches(self, host, url):
+        host = host.lower()
+        if self.host_in(host, self.exception_domains):
+            return False
+        if self.host_in(host, self.domains):
+            return True
+        if not self.goto:
+            return False
+        
+        url = url.lower()
+        goto, fail, exact, partial = self.goto, self.fail, self.exact, self.partial
+        state = 0
+        for code in url.encode('utf-8'):
+            if state:
+                while state and ((state << 8) | code) not in goto:
+                    state = fail[state]
+                state = goto.get((state << 8) | code, 0)
+            else:
+                # Из корня переход - просто байт, это самый частый случай
+                state = goto.get(code, 0)
+                if not state:
+                    continue
+            if exact[state]:
+                return True
+            if state in partial and self.match_wildcards(partial[state], url):
+                return True
+        return False
+    
+    def match_wildcards(self, ids, url):
+        for pattern_id in ids:
+            regex = self.compiled_wildcards.get(pattern_id)
+            if regex is None:
+                regex = re.compile('.*'.join(map(re.escape, self.wildcards[pattern_id].split('*'))))
+                self.compiled_wildcards[pattern_id] = regex
+            if regex.search(url):
+                return True
+        return False
+    
+    @classmethod
+    def load(cls, filters_path):
+        """Загружает списки из папки filters, используя скомпилированный кэш на диске"""
+        filter_files = sorted(Path(filters_path).glob('*.txt')) if os.path.isdir(filters_path) else []
+        signature = [cls.FORMAT_VERSION] + [
+            [f.name, f.stat().st_mtime_ns, f.stat().st_size] for f in filter_files
+        ]
+        cache_path = os.path.join(filters_path, '.compiled')
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_signature, data = pickle.load(f)
+            if cached_signature == signature:
+                return cls(data)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            pass
+        
+        lines = []
+        for filter_file in filter_files:
+            with open(filter_file, 'r', encoding='utf-8', errors='replace') as f:
+                lines.extend(f)
+        rules = cls.parse(lines)
+        
+        if filter_files:
+            try:
+                with open(cache_path, 'wb') as f:
+                    pickle.dump((signature, rules.to_data()), f, pickle.HIGHEST_PROTOCOL)
+            except OSError as e:
+                print(f"Не удалось сохранить кэш фильтров: {e}")
+        return rules
+
+class FilterLoaderSignals(QObject):
+    loaded = Signal(object)
+
+class FilterLoader(QRunnable):
+    """Загружает и компилирует списки фильтров в пуле потоков"""
+    def __init__(self, filters_path):
+        super().__init__()
+        self.filters_path = filters_path
+        self.signals = FilterLoaderSignals()
+    
+    def run(self):
+        try:
+            self.signals.loaded.emit(FilterRules.load(self.filters_path))
+        except Exception as e:
+            print(f"Ошибка загрузки фильтров: {e}")
+
+class RequestBlocker(QWebEngineUrlRequestInterceptor):
+    """Блокирует запросы к трекерам и рекламе по спискам из папки filters
+    
+    В Qt 6 interceptRequest вызывается в потоке интерфейса, поэтому каждая
+    проверка задерживает цикл событий браузера. Время проверок копится в
+    match_seconds и match_max и отдается в метриках рядом с задержкой цикла.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rules = FilterRules()
+        self.blocked = 0
+        self.checked = 0
+        self.match_seconds = 0.0
+        self.match_max = 0.0
+    
+    def set_rules(self, rules):
+        # Сигнал загрузчика приходит в тот же поток интерфейса, что и interceptRequest
+        self.rules = rules
+    
+    def interceptRequest(self, info):
+        # Саму страницу не блокируем, только ее ресурсы
+        if info.resourceType() == QWebEngineUrlRequestInfo.ResourceTypeMainFrame:
+            return
+        
+        url = info.requestUrl()
+        started = time.perf_counter()
+        blocked = self.rules.matches(url.host(), url.toString())
+        elapsed = time.perf_counter() - started
+        self.checked += 1
+        self.match_seconds += elapsed
+        self.match_max = max(self.match_max, elapsed)
+        if blocked:
+            info.block(True)
+            self.blocked += 1
+
 class ServerMonitorDialog(QDialog):
     def __init__(self, process, parent=None):
         super().__init__(parent)
@@ -53,43 +1158,428 @@ class ServerMonitorDialog(QDialog):
         data = self.process.readAllStandardError().data().decode()
         self.output_text.append(f"<font color='red'>{data}</font>")
 
-class ExtensionManager:
+EXTENSION_TYPES = ('python', 'html', 'exe', 'url')
+DEFAULT_START = {'python': 'app.py', 'html': 'index.html'}
+
+def validate_rules(rules, extension_path):
+    """Проверяет поля based_on/start/link из rules.json, возвращает список ошибок"""
+    if not isinstance(rules, dict):
+        return ["rules.json должен содержать объект"]
+    
+    errors = []
+    based_on = rules.get('based_on')
+    start = rules.get('start', DEFAULT_START.get(based_on))
+    if based_on not in EXTENSION_TYPES:
+        errors.append(f"Неизвестный тип расширения: {based_on}")
+    elif not isinstance(start, str) or not start.strip():
+        errors.append(f"Поле start обязательно для типа {based_on}")
+    elif based_on == 'url':
+        if not start.startswith(('http://', 'https://', 'file://')):
+            errors.append(f"Некорректный URL в поле start: {start}")
+    else:
+        # Стартовый файл должен лежать внутри папки расширения
+        start_path = os.path.normpath(os.path.join(extension_path, start))
+        if os.path.isabs(start) or not start_path.startswith(os.path.normpath(extension_path) + os.sep):
+            errors.append(f"Поле start выходит за пределы расширения: {start}")
+        elif not os.path.exists(start_path):
+            errors.append(f"Файл не найден: {start_path}")
+    
+    link = rules.get('link')
+    if link is not None and (not isinstance(link, str) or not link.startswith(('http://', 'https://'))):
+        errors.append(f"Некорректная ссылка в поле link: {link}")
+    
+    activation = rules.get('activation')
+    if activation not in (None, 'socket'):
+        errors.append(f"Неизвестный способ запуска: {activation}")
+    elif activation == 'socket' and (based_on not in ('python', 'exe') or not link):
+        errors.append("Запуск по сокету требует типа python или exe и поля link")
+    if not isinstance(rules.get('idle_timeout', 0), (int, float)):
+        errors.append("Поле idle_timeout должно быть числом секунд")
+    if rules.get('idle_action', 'freeze') not in ('freeze', 'stop'):
+        errors.append(f"Неизвестное действие при простое: {rules.get('idle_action')}")
+    
+    dependencies = rules.get('dependencies', [])
+    if not isinstance(dependencies, list) or not all(isinstance(d, str) for d in dependencies):
+        errors.append("Поле dependencies должно быть списком строк")
+    
+    return errors
+
+class ManifestLoaderSignals(QObject):
+    loaded = Signal(int, str, object)
+    failed = Signal(int, str, str)
+    finished = Signal(int)
+
+class ManifestLoader(QRunnable):
+    """Читает список расширений и их rules.json в пуле потоков"""
+    def __init__(self, additions_path, generation):
+        super().__init__()
+        self.additions_path = additions_path
+        self.generation = generation
+        self.signals = ManifestLoaderSignals()
+        self.cancelled = threading.Event()
+    
+    def cancel(self):
+        self.cancelled.set()
+    
+    def run(self):
+        try:
+            registry_file = os.path.join(self.additions_path, "registry.db")
+            additions_file = os.path.join(self.additions_path, "additions_list.json")
+            source = registry_file if os.path.exists(registry_file) else additions_file
+            if os.path.exists(source):
+                try:
+                    additions_data = self.read_additions(source)
+                except Exception as e:
+                    self.signals.failed.emit(self.generation, os.path.basename(source), str(e))
+                    return
+                
+                for name, path in additions_data.items():
+                    if self.cancelled.is_set():
+                        return
+                    self.load_manifest(name, path)
+        finally:
+            self.signals.finished.emit(self.generation)
+    
+    @staticmethod
+    def read_additions(source):
+        """{имя: путь} из реестра менеджера или, пока его нет, из additions_list.json"""
+        if source.endswith('.db'):
+            # Только чтение: в WAL оно не ждет записи менеджера и не блокирует ее
+            conn = sqlite3.connect(f"{Path(source).as_uri()}?mode=ro", uri=True, timeout=10)
+            try:
+                return dict(conn.execute("SELECT name, path FROM extensions ORDER BY name").fetchall())
+            finally:
+                conn.close()
+        
+        with open(source, 'r', encoding='utf-8') as f:
+            additions_data = json.load(f)
+        if not isinstance(additions_data, dict):
+            raise ValueError("ожидается объект {имя: путь}")
+        return additions_data
+    
+    def load_manifest(self, name, path):
+        """Загружает и проверяет rules.json одного расширения"""
+        # Ошибка в одном манифесте не должна скрывать остальные расширения
+        try:
+            extension_path = os.path.join(self.additions_path, path)
+            rules_file = os.path.join(extension_path, "rules.json")
+            if not os.path.exists(rules_file):
+                raise FileNotFoundError(f"Файл не найден: {rules_file}")
+            
+            with open(rules_file, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            
+            errors = validate_rules(rules, extension_path)
+            if errors:
+                raise ValueError("; ".join(errors))
+            
+            self.signals.loaded.emit(self.generation, name, {
+                'path': extension_path,
+                'rules': rules,
+                'running': False
+            })
+        except Exception as e:
+            self.signals.failed.emit(self.generation, name, str(e))
+
+IPC_HEADER = struct.Struct('!I')
+
+def encode_ipc_message(message):
+    """Кадр IPC: длина (4 байта, big-endian) + JSON"""
+    payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    return IPC_HEADER.pack(len(payload)) + payload
+
+class IpcServer(QObject):
+    """Локальный канал (Unix-сокет) между браузером и процессами расширений"""
+    message_received = Signal(object, object)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.path = os.path.join(tempfile.gettempdir(), f"toolsbrowser-{os.getpid()}.sock")
+        self.buffers = {}
+        self.clients = {}
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+        QLocalServer.removeServer(self.path)
+        if not self.server.listen(self.path):
+            print(f"Не удалось открыть IPC канал: {self.server.errorString()}")
+        
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.close)
+    
+    def is_listening(self):
+        return self.server.isListening()
+    
+    def close(self):
+        self.buffers.clear()
+        self.clients.clear()
+        self.server.close()
+        QLocalServer.removeServer(self.path)
+    
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            self.buffers[sock] = bytearray()
+            sock.readyRead.connect(lambda sock=sock: self.on_ready_read(sock))
+            sock.disconnected.connect(lambda sock=sock: self.on_disconnected(sock))
+    
+    def on_disconnected(self, sock):
+        if self.buffers.pop(sock, None) is None:
+            return
+        for name, client in list(self.clients.items()):
+            if client is sock:
+                del self.clients[name]
+        sock.deleteLater()
+    
+    def on_ready_read(self, sock):
+        buffer = self.buffers.get(sock)
+        if buffer is None:
+            return
+        buffer += sock.readAll().data()
+        
+        while len(buffer) >= IPC_HEADER.size:
+            (length,) = IPC_HEADER.unpack_from(buffer)
+            if len(buffer) < IPC_HEADER.size + length:
+                break
+            payload = bytes(buffer[IPC_HEADER.size:IPC_HEADER.size + length])
+            del buffer[:IPC_HEADER.size + length]
+            
+            try:
+                message = json.loads(payload)
+            except ValueError as e:
+                print(f"Некорректное IPC сообщение: {e}")
+                continue
+            if isinstance(message, dict):
+                self.dispatch(sock, message)
+    
+    def dispatch(self, sock, message):
+        message_type = message.get('type')
+        if message_type == 'hello':
+            self.clients[message.get('name')] = sock
+        elif message_type == 'reply' and message.get('id') in self.pending:
+            self.pending.pop(message['id'])(message)
+            return
+        elif message_type == 'ping':
+            self.reply(sock, message, type='pong')
+            return
+        
+        self.message_received.emit(sock, message)
+    
+    def send_to(self, sock, message):
+        sock.write(encode_ipc_message(message))
+        sock.flush()
+    
+    def reply(self, sock, request, **fields):
+        fields.setdefault('type', 'reply')
+        fields['id'] = request.get('id')
+        self.send_to(sock, fields)
+    
+    def send(self, name, message, callback=None):
+        """Отправляет сообщение расширению; callback получит ответ"""
+        sock = self.clients.get(name)
+        if sock is None:
+            return False
+        
+        if callback:
+            message = dict(message, id=next(self.request_ids))
+            self.pending[message['id']] = callback
+        self.send_to(sock, message)
+        return True
+
+def read_process_stats(pid):
+    """Память (КБ) и процессорное время (с) процесса из /proc, None если недоступно"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            rss_kb = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0)
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        return {'rss_kb': rss_kb, 'cpu_seconds': cpu_seconds}
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+class EventLoopMonitor(QObject):
+    """Замеряет, насколько поздно срабатывает таймер GUI-потока
+    
+    Опоздание тика больше stall_threshold считается зависанием
+    интерфейса: значит, очередь событий была занята чем-то долгим.
+    """
+    def __init__(self, interval_ms=100, stall_threshold=0.25, parent=None):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self.stall_threshold = stall_threshold
+        self.ticks = 0
+        self.stalls = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_tick = time.monotonic()
+        
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.on_tick)
+        self.timer.start(interval_ms)
+    
+    def on_tick(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self.last_tick - self.interval)
+        self.last_tick = now
+        self.ticks += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        if lag >= self.stall_threshold:
+            self.stalls += 1
+
+def format_metrics(samples):
+    """Текстовый формат Prometheus из списка (имя, тип, значение, метки)"""
+    lines = []
+    described = set()
+    for name, kind, value, labels in samples:
+        if name not in described:
+            described.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+        escaped = {key: str(val).replace('\\', '\\\\').replace('"', '\\"') for key, val in labels.items()}
+        label_text = ','.join(f'{key}="{val}"' for key, val in sorted(escaped.items()))
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+class SocketActivation(QObject):
+    """Слушающий сокет расширения, которым владеет браузер
+    
+    Процесс запускается при первом подключении и получает сокет через
+    переменную LISTEN_FD. Пока процесс заморожен или остановлен, новое
+    подключение снова будит его.
+    """
+    connection_pending = Signal(str)
+    
+    def __init__(self, name, host, port, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((host, port))
+            self.sock.listen(128)
+        except OSError:
+            self.sock.close()
+            raise
+        
+        self.notifier = QSocketNotifier(self.sock.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.on_activated)
+        self.frozen = False
+        self.activated_at = None
+        self.last_cpu = None
+        self.idle_since = time.monotonic()
+    
+    def on_activated(self):
+        # Подключение примет сам процесс, браузер только будит его
+        self.notifier.setEnabled(False)
+        self.activated_at = time.monotonic()
+        self.connection_pending.emit(self.name)
+    
+    def wait_for_connection(self):
+        self.notifier.setEnabled(True)
+    
+    def close(self):
+        self.notifier.setEnabled(False)
+        self.sock.close()
+
+class ExtensionManager(QObject):
+    extension_loaded = Signal(str)
+    extension_failed = Signal(str, str)
+    extensions_reloaded = Signal()
+    
     def __init__(self, browser):
+        super().__init__(browser)
         self.browser = browser
         self.additions_path = self.get_additions_path()
         self.extensions = {}
         self.processes = {}
-        self.load_extensions()
+        self.failed = {}
+        self.thread_pool = QThreadPool(self)
+        self.loader = None
+        self.generation = 0
+        
+        # Порты, о которых расширения сообщили по IPC, и ссылки, ждущие этого сообщения
+        self.ports = {}
+        self.pending_links = {}
+        self.ipc = IpcServer(self)
+        self.ipc.message_received.connect(self.on_ipc_message)
+        
+        # Расширения, запускаемые по первому подключению, и статистика простоя
+        self.activations = {}
+        self.activation_latency = {}
+        self.suspension_stats = {}
+        # Процессы, которые завершаются после stop: держим ссылки до сигнала finished
+        self.stopping = set()
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(30000)
+        self.idle_timer.timeout.connect(self.check_idle)
+        self.idle_timer.start()
+        
+        app = QCoreApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.shutdown)
     
     def get_additions_path(self):
-        """Возвращает абсолютный путь к папке additions"""
+        """Возвращает абсолютный путь к папке additions (ADDITIONS_PATH переопределяет ее)"""
+        if os.environ.get('ADDITIONS_PATH'):
+            return os.path.abspath(os.environ['ADDITIONS_PATH'])
         script_dir = Path(__file__).parent.absolute()
         additions_path = script_dir / "additions"
         return str(additions_path)
     
     def load_extensions(self):
-        """Загружает список расширений из additions_list.json"""
-        try:
-            additions_file = os.path.join(self.additions_path, "additions_list.json")
-            if os.path.exists(additions_file):
-                with open(additions_file, 'r', encoding='utf-8') as f:
-                    additions_data = json.load(f)
-                
-                for name, path in additions_data.items():
-                    extension_path = os.path.join(self.additions_path, path)
-                    rules_file = os.path.join(extension_path, "rules.json")
-                    
-                    if os.path.exists(rules_file):
-                        with open(rules_file, 'r', encoding='utf-8') as f:
-                            rules = json.load(f)
-                        
-                        self.extensions[name] = {
-                            'path': extension_path,
-                            'rules': rules,
-                            'running': False
-                        }
-        except Exception as e:
-            print(f"Ошибка загрузки расширений: {e}")
+        """Запускает фоновую загрузку расширений из реестра (или additions_list.json)"""
+        self.cancel_loading()
+        self.generation += 1
+        self.failed = {}
+        
+        # Запущенные расширения оставляем, остальные перечитываем заново
+        self.extensions = {name: ext for name, ext in self.extensions.items() if ext['running']}
+        
+        self.loader = ManifestLoader(self.additions_path, self.generation)
+        self.loader.signals.loaded.connect(self.on_manifest_loaded)
+        self.loader.signals.failed.connect(self.on_manifest_failed)
+        self.loader.signals.finished.connect(self.on_loading_finished)
+        self.thread_pool.start(self.loader)
+    
+    def cancel_loading(self):
+        """Отменяет текущую загрузку расширений"""
+        if self.loader:
+            self.loader.cancel()
+            self.loader = None
+    
+    def on_manifest_loaded(self, generation, name, ext):
+        if generation != self.generation:
+            return
+        
+        old = self.extensions.get(name)
+        if old and old['running']:
+            ext['running'] = True
+            if 'process' in old:
+                ext['process'] = old['process']
+        
+        self.extensions[name] = ext
+        self.extension_loaded.emit(name)
+    
+    def on_manifest_failed(self, generation, name, error):
+        if generation != self.generation:
+            return
+        
+        print(f"Ошибка загрузки расширения {name}: {error}")
+        self.failed[name] = error
+        self.extension_failed.emit(name, error)
+    
+    def on_loading_finished(self, generation):
+        if generation != self.generation:
+            return
+        
+        self.loader = None
+        self.extensions_reloaded.emit()
     
     def get_extension_info(self, name):
         """Возвращает информацию о расширении"""
@@ -111,6 +1601,13 @@ class ExtensionManager:
             ext = self.extensions[name]
             rules = ext['rules']
             
+            if rules.get('activation') == 'socket' and os.name == 'posix':
+                result = self.run_on_demand(name)
+                if result is not None:
+                    return result
+                # Порт из link занят: запускаем обычным способом, порт расширение сообщит по IPC
+                print(f"Расширение {name} будет запущено без ожидания подключения")
+            
             try:
                 if rules.get('based_on') == 'python':
                     # Запуск Python скрипта
@@ -123,11 +1620,9 @@ class ExtensionManager:
                     process.setWorkingDirectory(ext['path'])
                     
                     # Устанавливаем переменные окружения
-                    env = QProcessEnvironment.systemEnvironment()
-                    env.insert("ADDITIONS_PATH", self.additions_path)
-                    process.setProcessEnvironment(env)
+                    process.setProcessEnvironment(self.extension_environment(name))
                     
-                    process.start('python', [script_path])
+                    process.start(self.extension_python(ext['path']), [script_path])
                     
                     self.processes[name] = process
                     self.extensions[name]['running'] = True
@@ -135,7 +1630,7 @@ class ExtensionManager:
                     # Если есть ссылка, открываем ее
                     link = rules.get('link')
                     if link:
-                        self.browser.add_new_tab(QUrl(link), name)
+                        self.open_link_when_ready(name, link)
                     
                     return process
                 
@@ -162,6 +1657,7 @@ class ExtensionManager:
                     
                     process = QProcess()
                     process.setWorkingDirectory(ext['path'])
+                    process.setProcessEnvironment(self.extension_environment(name))
                     process.start(exe_path)
                     
                     self.processes[name] = process
@@ -170,7 +1666,7 @@ class ExtensionManager:
                     # Если есть ссылка, открываем ее
                     link = rules.get('link')
                     if link:
-                        self.browser.add_new_tab(QUrl(link), name)
+                        self.open_link_when_ready(name, link)
                     
                     return process
                 
@@ -200,29 +1696,287 @@ class ExtensionManager:
             rules = ext['rules']
             link = rules.get('link')
             if link:
-                self.browser.add_new_tab(QUrl(link), name)
+                self.browser.add_new_tab(self.extension_url(name, link), name)
             return self.processes.get(name, True)
         
         else:
             print(f"Расширение {name} не найдено")
             return None
     
+    @staticmethod
+    def extension_python(extension_path):
+        """Интерпретатор из .venv расширения, если менеджер его создал
+        
+        Менеджер компилирует байткод тем же интерпретатором (extension_python в menager.py).
+        """
+        if os.name == 'nt':
+            venv_python = os.path.join(extension_path, '.venv', 'Scripts', 'python.exe')
+        else:
+            venv_python = os.path.join(extension_path, '.venv', 'bin', 'python')
+        return venv_python if os.path.exists(venv_python) else 'python'
+    
+    def extension_environment(self, name):
+        """Переменные окружения для процесса расширения"""
+        env = QProcessEnvironment.systemEnvironment()
+        env.insert("ADDITIONS_PATH", self.additions_path)
+        env.insert("EXTENSION_NAME", name)
+        if self.extensions.get(name, {}).get('rules', {}).get('based_on') == 'python':
+            # Байткод, скомпилированный менеджером при установке. Префикс общий: python
+            # повторяет в нем абсолютные пути, и стандартная библиотека компилируется один раз
+            env.insert("PYTHONPYCACHEPREFIX", os.path.join(self.additions_path, '.pycache'))
+        if self.ipc.is_listening():
+            env.insert("BROWSER_IPC_PATH", self.ipc.path)
+        return env
+    
+    def extension_url(self, name, link):
+        """Ссылка расширения с портом, который оно сообщило по IPC"""
+        url = QUrl(link)
+        if name in self.ports:
+            url.setPort(self.ports[name])
+        return url
+    
+    def open_link_when_ready(self, name, link):
+        """Открывает ссылку после hello по IPC или по таймауту"""
+        if not self.ipc.is_listening():
+            self.browser.add_new_tab(QUrl(link), name)
+            return
+        
+        self.pending_links[name] = link
+        QTimer.singleShot(5000, lambda: self.open_pending_link(name))
+    
+    def open_pending_link(self, name):
+        link = self.pending_links.pop(name, None)
+        if link:
+            self.browser.add_new_tab(self.extension_url(name, link), name)
+    
+    def on_ipc_message(self, sock, message):
+        """Обрабатывает сообщения расширений"""
+        message_type = message.get('type')
+        name = message.get('name')
+        
+        if message_type == 'hello':
+            if message.get('port'):
+                self.ports[name] = int(message['port'])
+            self.record_activation_latency(name)
+            self.open_pending_link(name)
+        
+        elif message_type == 'registry_changed':
+            self.browser.reload_extensions()
+        
+        elif message_type == 'start':
+            result = self.run_extension(name)
+            self.browser.update_extensions_list()
+            self.ipc.reply(sock, message, success=bool(result))
+        
+        elif message_type == 'stop':
+            result = self.stop_extension(name)
+            self.browser.update_extensions_list()
+            self.ipc.reply(sock, message, success=result)
+        
+        elif message_type == 'status':
+            self.ipc.reply(sock, message, extensions={
+                ext_name: ext['running'] for ext_name, ext in self.extensions.items()
+            })
+        
+        elif message_type == 'metrics':
+            self.ipc.reply(sock, message, text=self.browser.metrics_text())
+    
+    def install_archive(self, name, archive_path, callback):
+        """Устанавливает скачанный архив через менеджер расширений"""
+        message = {'type': 'install', 'name': name, 'path': archive_path}
+        if not self.ipc.send("Extension Manager", message, callback):
+            callback({'success': False, 'message': 'Менеджер расширений не запущен'})
+    
+    def run_on_demand(self, name):
+        """Открывает сокет расширения; сам процесс запустится при первом подключении"""
+        link = self.extensions[name]['rules']['link']
+        url = QUrl(link)
+        
+        if name not in self.activations:
+            try:
+                activation = SocketActivation(name, url.host(), url.port(80), self)
+            except OSError as e:
+                print(f"Не удалось открыть сокет расширения {name}: {e}")
+                return None
+            activation.connection_pending.connect(self.on_connection_pending)
+            self.activations[name] = activation
+        
+        self.extensions[name]['running'] = True
+        self.browser.add_new_tab(url, name)
+        return True
+    
+    def on_connection_pending(self, name):
+        """Первое подключение: запускает или размораживает процесс расширения"""
+        activation = self.activations.get(name)
+        if activation is None:
+            return
+        
+        process = self.processes.get(name)
+        if process and process.state() == QProcess.Running:
+            if activation.frozen:
+                os.kill(process.processId(), signal.SIGCONT)
+                activation.frozen = False
+                activation.activated_at = None
+                activation.idle_since = time.monotonic()
+                print(f"Расширение {name} разморожено")
+            return
+        
+        ext = self.extensions[name]
+        rules = ext['rules']
+        if rules.get('based_on') == 'python':
+            program = self.extension_python(ext['path'])
+            arguments = [os.path.join(ext['path'], rules.get('start', 'app.py'))]
+        else:
+            program = os.path.join(ext['path'], rules['start'])
+            arguments = []
+        
+        env = self.extension_environment(name)
+        env.insert("LISTEN_FD", str(activation.sock.fileno()))
+        
+        process = QProcess()
+        process.setWorkingDirectory(ext['path'])
+        process.setProcessEnvironment(env)
+        process.started.connect(lambda name=name: self.on_activated_process_started(name))
+        process.finished.connect(lambda *_, name=name: self.on_activated_process_finished(name))
+        
+        # Сокет наследуется только процессом, который запускается сейчас
+        activation.sock.set_inheritable(True)
+        try:
+            process.start(program, arguments)
+        finally:
+            activation.sock.set_inheritable(False)
+        
+        self.processes[name] = process
+        ext['process'] = process
+    
+    def on_activated_process_started(self, name):
+        activation = self.activations.get(name)
+        if activation:
+            activation.idle_since = time.monotonic()
+    
+    def record_activation_latency(self, name):
+        """Время от первого подключения до готовности расширения (hello по IPC)"""
+        activation = self.activations.get(name)
+        if activation and activation.activated_at is not None:
+            latency = time.monotonic() - activation.activated_at
+            activation.activated_at = None
+            self.activation_latency[name] = latency
+            print(f"Расширение {name} запущено по подключению за {latency * 1000:.0f} мс")
+    
+    def on_activated_process_finished(self, name):
+        """Процесс завершился сам или остановлен по простою - ждем следующего подключения"""
+        activation = self.activations.get(name)
+        if activation and self.processes.get(name) is not None:
+            self.processes.pop(name, None)
+            activation.frozen = False
+            activation.wait_for_connection()
+    
+    def extension_has_tabs(self, link):
+        """Открыта ли вкладка с адресом расширения"""
+        target = QUrl(link)
+        for i in range(self.browser.tabs.count()):
+            url = self.browser.tabs.widget(i).url()
+            if url.host() == target.host() and url.port(80) == target.port(80):
+                return True
+        return False
+    
+    def check_idle(self):
+        """Замораживает или останавливает расширения, простаивающие дольше idle_timeout"""
+        now = time.monotonic()
+        for name, activation in list(self.activations.items()):
+            process = self.processes.get(name)
+            if not process or process.state() != QProcess.Running or activation.frozen:
+                continue
+            
+            rules = self.extensions[name]['rules']
+            stats = read_process_stats(process.processId())
+            cpu = stats['cpu_seconds'] if stats else None
+            busy = cpu is not None and activation.last_cpu is not None and cpu > activation.last_cpu
+            activation.last_cpu = cpu
+            if busy or self.extension_has_tabs(rules['link']):
+                activation.idle_since = now
+                continue
+            
+            if now - activation.idle_since >= rules.get('idle_timeout', 600):
+                self.suspend_extension(name, rules.get('idle_action', 'freeze'), stats)
+    
+    def suspend_extension(self, name, action, stats):
+        activation = self.activations[name]
+        process = self.processes[name]
+        
+        report = dict(stats or {}, action=action, suspended_at=time.time())
+        report['count'] = self.suspension_stats.get(name, {}).get('count', 0) + 1
+        self.suspension_stats[name] = report
+        
+        if action == 'stop':
+            self.shutdown_process(name, process, ask=False)
+            print(f"Расширение {name} остановлено по простою, освобождено {report.get('rss_kb', 0)} КБ")
+        else:
+            os.kill(process.processId(), signal.SIGSTOP)
+            activation.frozen = True
+            activation.wait_for_connection()
+            print(f"Расширение {name} заморожено по простою ({report.get('rss_kb', 0)} КБ в памяти можно выгрузить)")
+    
     def stop_extension(self, name):
         """Останавливает расширение"""
+        activation = self.activations.pop(name, None)
+        if activation:
+            activation.close()
+            process = self.processes.get(name)
+            if process and activation.frozen:
+                os.kill(process.processId(), signal.SIGCONT)
+            if name not in self.processes:
+                self.extensions[name]['running'] = False
+                return True
+        
         if name in self.processes:
-            process = self.processes[name]
-            process.terminate()
-            process.waitForFinished(1000)
-            if process.state() == QProcess.Running:
-                process.kill()
-            
-            del self.processes[name]
+            process = self.processes.pop(name)
+            self.shutdown_process(name, process)
+            self.ports.pop(name, None)
+            self.pending_links.pop(name, None)
             self.extensions[name]['running'] = False
             return True
         return False
+    
+    def shutdown(self):
+        """Останавливает расширения, запущенные по подключению, при выходе из браузера
+        
+        Замороженный SIGSTOP процесс не заметит ни stop по IPC, ни разрыв
+        соединения, поэтому stop_extension сначала размораживает его. Таймеры
+        shutdown_process после выхода из цикла событий уже не сработают:
+        оставшиеся процессы ждем здесь не дольше секунды на все, затем kill.
+        """
+        for name in list(self.activations):
+            self.stop_extension(name)
+        
+        deadline = time.monotonic() + 1
+        for process in list(self.stopping):
+            process.waitForFinished(max(0, int((deadline - time.monotonic()) * 1000)))
+            if process.state() != QProcess.NotRunning:
+                process.kill()
+                process.waitForFinished(1000)
+    
+    def shutdown_process(self, name, process, ask=True):
+        """Завершает процесс расширения, не блокируя окно
+        
+        Сначала расширение просят завершиться по IPC, через секунду
+        процессу отправляется terminate, еще через секунду - kill.
+        """
+        if process.state() == QProcess.NotRunning:
+            return
+        
+        self.stopping.add(process)
+        process.finished.connect(lambda *_: self.stopping.discard(process))
+        
+        if not (ask and self.ipc.send(name, {'type': 'stop'})):
+            process.terminate()
+        QTimer.singleShot(1000, lambda: process.state() != QProcess.NotRunning and process.terminate())
+        QTimer.singleShot(2000, lambda: process.state() != QProcess.NotRunning and process.kill())
 
 class Browser(QMainWindow):
-    def __init__(self):
+    def __init__(self, settings=None, history_path=None, index_path=None, storage_path=None):
+        """settings, history_path и index_path по умолчанию берутся из папки браузера,
+        storage_path (кэш и cookies профиля) - из стандартной папки данных Qt"""
         super().__init__()
         self.setWindowTitle("Офлайн Браузер")
         self.setGeometry(100, 100, 1400, 900)
@@ -230,9 +1984,44 @@ class Browser(QMainWindow):
         # Получаем абсолютный путь к директории скрипта
         self.script_dir = Path(__file__).parent.absolute()
         
+        # Настройки и профиль вкладок настраиваются до создания первой вкладки
+        self.settings = settings or load_settings()
+        # Профиль по умолчанию в Qt 6 не сохраняется на диск, и дисковый кэш в нем
+        # работает как кэш в памяти. Именованный профиль хранит кэш между запусками.
+        # Родитель - приложение: профиль должен пережить страницы вкладок.
+        self.profile = QWebEngineProfile("default", QCoreApplication.instance())
+        if storage_path:
+            self.profile.setPersistentStoragePath(os.path.join(storage_path, "storage"))
+            self.profile.setCachePath(os.path.join(storage_path, "cache"))
+        configure_profile(self.profile, self.settings)
+        
+        # Блокировка запросов по спискам фильтров, списки компилируются в фоне
+        self.request_blocker = RequestBlocker(self)
+        self.profile.setUrlRequestInterceptor(self.request_blocker)
+        self.filter_loader = FilterLoader(str(self.script_dir / "filters"))
+        self.filter_loader.signals.loaded.connect(self.request_blocker.set_rules)
+        QThreadPool.globalInstance().start(self.filter_loader)
+        
+        # Загрузки со страниц
+        self.download_manager = DownloadManager(self.profile, self.settings, self)
+        self.download_manager.download_finished.connect(self.on_download_finished)
+        self.downloads_dialog = None
+        
+        # История посещений и предсказание следующей страницы
+        self.history = VisitHistory(history_path or self.script_dir / "history.json")
+        self.predictor = Predictor(self.profile, self.history, self.open_urls, self)
+        QCoreApplication.instance().aboutToQuit.connect(self.history.save)
+        
+        # Полнотекстовый индекс посещенных страниц
+        self.page_indexer = PageIndexer(index_path or self.script_dir / "page_index.db", self)
+        self.search_dialog = None
+        
         # Менеджер расширений
         self.extension_manager = ExtensionManager(self)
         
+        # Замер задержек цикла событий для метрик
+        self.event_loop_monitor = EventLoopMonitor(parent=self)
+        
         # Устанавливаем темную тему
         self.set_dark_theme()
         
@@ -306,8 +2095,13 @@ class Browser(QMainWindow):
         self.extensions_scroll.setWidget(self.extensions_widget)
         menu_layout.addWidget(self.extensions_scroll)
         
-        # Обновляем список расширений
+        # Загружаем расширения в фоне, виджеты добавляются по мере проверки манифестов
+        self.extension_widgets = {}
+        self.extension_manager.extension_loaded.connect(self.on_extension_loaded)
+        self.extension_manager.extension_failed.connect(self.add_failed_extension_widget)
+        self.extension_manager.extensions_reloaded.connect(self.update_extensions_list)
         self.update_extensions_list()
+        self.extension_manager.load_extensions()
         
         # Кнопки внизу меню
         menu_bottom_widget = QWidget()
@@ -330,6 +2124,7 @@ class Browser(QMainWindow):
             }
         """)
         settings_btn.setToolTip("Настройки")
+        settings_btn.clicked.connect(self.show_settings)
         menu_bottom_layout.addWidget(settings_btn)
         
         # Кнопка расширений
@@ -351,6 +2146,25 @@ class Browser(QMainWindow):
         extensions_btn.clicked.connect(lambda: self.extension_manager.run_extension("Extension Manager"))
         menu_bottom_layout.addWidget(extensions_btn)
         
+        # Кнопка загрузок
+        downloads_btn = QPushButton("⬇")
+        downloads_btn.setFixedSize(40, 40)
+        downloads_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #2d2d2d;
+                border: none;
+                border-radius: 8px;
+                color: white;
+                font-size: 16px;
+            }
+            QPushButton:hover {
+                background-color: #3d3d3d;
+            }
+        """)
+        downloads_btn.setToolTip("Загрузки")
+        downloads_btn.clicked.connect(self.show_downloads)
+        menu_bottom_layout.addWidget(downloads_btn)
+        
         menu_layout.addStretch()
         menu_layout.addWidget(menu_bottom_widget)
         
@@ -419,6 +2233,7 @@ class Browser(QMainWindow):
         """)
         self.url_bar.setPlaceholderText("Введите URL или путь к файлу...")
         self.url_bar.returnPressed.connect(self.navigate_to_url)
+        self.url_bar.textEdited.connect(self.predictor.on_text_edited)
         navbar.addWidget(self.url_bar)
         
         # Кнопка новой вкладки
@@ -478,7 +2293,12 @@ class Browser(QMainWindow):
         main_layout.addWidget(browser_widget, 1)
         
         # Добавляем первую вкладку
-        self.add_new_tab(QUrl("https://ya.ru"), 'Яндекс')
+        self.add_new_tab(QUrl(self.settings['home_page']), 'Домашняя')
+        
+        # Когда окно простаивает, прогреваем домашнюю и самые посещаемые страницы,
+        # если они не открыты во вкладках (домашняя обычно уже загружена первой вкладкой)
+        QTimer.singleShot(5000, lambda: self.predictor.warm_up(
+            [self.settings['home_page']] + self.history.most_visited(3)))
         
         # Анимация для меню
         self.menu_animation = QPropertyAnimation(self.menu_frame, b"minimumWidth")
@@ -495,6 +2315,28 @@ class Browser(QMainWindow):
         f11_action.setShortcut(QKeySequence("F11"))
         f11_action.triggered.connect(self.show_server_monitor)
         self.addAction(f11_action)
+        
+        # Ctrl+Shift+E - перечитать расширения
+        reload_extensions_action = QAction(self)
+        reload_extensions_action.setShortcut(QKeySequence("Ctrl+Shift+E"))
+        reload_extensions_action.triggered.connect(self.reload_extensions)
+        self.addAction(reload_extensions_action)
+        
+        # Ctrl+J - загрузки
+        downloads_action = QAction(self)
+        downloads_action.setShortcut(QKeySequence("Ctrl+J"))
+        downloads_action.triggered.connect(self.show_downloads)
+        self.addAction(downloads_action)
+        
+        # Ctrl+Shift+F - поиск по тексту посещенных страниц
+        search_action = QAction(self)
+        search_action.setShortcut(QKeySequence("Ctrl+Shift+F"))
+        search_action.triggered.connect(self.show_search)
+        self.addAction(search_action)
+    
+    def reload_extensions(self):
+        """Перечитывает расширения, не блокируя окно; список пересобирается по extensions_reloaded"""
+        self.extension_manager.load_extensions()
     
     def get_toolbar_button_style(self):
         return """
@@ -562,12 +2404,24 @@ class Browser(QMainWindow):
             widget = self.extensions_layout.itemAt(i).widget()
             if widget:
                 widget.deleteLater()
+        self.extension_widgets = {}
         
         # Добавляем расширения
         for name in self.extension_manager.extensions.keys():
             ext_info = self.extension_manager.get_extension_info(name)
             if ext_info:
                 self.add_extension_widget(ext_info)
+        
+        # Расширения с ошибкой в манифесте показываем, чтобы ошибку было видно не только в консоли
+        for name, error in self.extension_manager.failed.items():
+            if name not in self.extension_manager.extensions:
+                self.add_failed_extension_widget(name, error)
+    
+    def on_extension_loaded(self, name):
+        """Добавляет или обновляет виджет только что загруженного расширения"""
+        ext_info = self.extension_manager.get_extension_info(name)
+        if ext_info:
+            self.add_extension_widget(ext_info)
     
     def add_extension_widget(self, ext_info):
         """Добавляет виджет расширения в список"""
@@ -625,11 +2479,62 @@ class Browser(QMainWindow):
         run_btn.clicked.connect(lambda: self.toggle_extension(ext_info['name'], run_btn))
         layout.addWidget(run_btn)
         
-        self.extensions_layout.addWidget(ext_frame)
+        self.place_extension_widget(ext_info['name'], ext_frame)
+    
+    def add_failed_extension_widget(self, name, error):
+        """Добавляет виджет расширения, манифест которого не прошел проверку"""
+        ext_frame = QFrame()
+        ext_frame.setFixedHeight(50)
+        ext_frame.setToolTip(error)
+        ext_frame.setStyleSheet("""
+            QFrame {
+                background-color: #2d2d2d;
+                border-radius: 6px;
+                padding: 5px;
+            }
+        """)
+        
+        layout = QHBoxLayout(ext_frame)
+        layout.setContentsMargins(5, 5, 5, 5)
+        
+        logo_label = QLabel("⚠")
+        logo_label.setFixedSize(30, 30)
+        layout.addWidget(logo_label)
+        
+        info_widget = QWidget()
+        info_layout = QVBoxLayout(info_widget)
+        info_layout.setContentsMargins(0, 0, 0, 0)
+        
+        name_label = QLabel(name)
+        name_label.setStyleSheet("color: white; font-weight: bold; font-size: 11px;")
+        info_layout.addWidget(name_label)
+        
+        error_label = QLabel(f"Ошибка: {error}")
+        error_label.setStyleSheet("color: #ff9800; font-size: 9px;")
+        info_layout.addWidget(error_label)
+        
+        layout.addWidget(info_widget)
+        self.place_extension_widget(name, ext_frame)
+    
+    def place_extension_widget(self, name, ext_frame):
+        old_frame = self.extension_widgets.get(name)
+        if old_frame:
+            # Заменяем виджет на том же месте
+            index = self.extensions_layout.indexOf(old_frame)
+            self.extensions_layout.insertWidget(index, ext_frame)
+            self.extensions_layout.removeWidget(old_frame)
+            old_frame.deleteLater()
+        else:
+            self.extensions_layout.addWidget(ext_frame)
+        self.extension_widgets[name] = ext_frame
     
     def toggle_extension(self, name, button):
         """Запускает/останавливает расширение"""
-        ext = self.extension_manager.extensions[name]
+        ext = self.extension_manager.extensions.get(name)
+        if ext is None:
+            # Расширение удалили, пока виджет еще был в списке
+            self.update_extensions_list()
+            return
         
         if ext['running']:
             # Останавливаем
@@ -708,6 +2613,100 @@ class Browser(QMainWindow):
         
         dialog.exec()
     
+    def show_settings(self):
+        """Показывает диалог настроек"""
+        dialog = SettingsDialog(self.settings, self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        
+        settings = dialog.get_settings()
+        restart_required = chromium_flags(settings) != chromium_flags(self.settings)
+        self.settings = settings
+        save_settings(self.settings)
+        configure_profile(self.profile, self.settings)
+        self.download_manager.apply_settings(self.settings)
+        
+        if restart_required:
+            QMessageBox.information(self, "Настройки", "Изменения модели процессов вступят в силу после перезапуска браузера")
+    
+    def show_downloads(self):
+        """Показывает панель загрузок, не блокируя окно"""
+        if self.downloads_dialog is None:
+            self.downloads_dialog = DownloadsDialog(self.download_manager, self)
+        self.downloads_dialog.show()
+        self.downloads_dialog.raise_()
+    
+    def show_search(self):
+        """Показывает поиск по посещенным страницам"""
+        if self.search_dialog is None:
+            self.search_dialog = SearchDialog(self.page_indexer, self)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.activateWindow()
+    
+    def on_download_finished(self, download):
+        """Предлагает установить скачанный архив, если это расширение"""
+        path = os.path.join(download.downloadDirectory(), download.downloadFileName())
+        if not path.endswith('.zip'):
+            return
+        
+        rules = read_archive_rules(path)
+        if rules is None:
+            return
+        
+        name = rules.get('name') or Path(path).stem
+        answer = QMessageBox.question(self, "Расширение", f"Установить расширение «{name}»?")
+        if answer == QMessageBox.Yes:
+            self.extension_manager.install_archive(name, path, lambda reply: QMessageBox.information(
+                self, "Расширение", reply.get('message', '')))
+    
+    def renderer_pids(self):
+        """Идентификаторы живых процессов рендеринга вкладок и предзагрузки"""
+        pages = [self.tabs.widget(i).page() for i in range(self.tabs.count())]
+        pages += [self.predictor.page, self.predictor.hints_page]
+        return {page.renderProcessPid() for page in pages} - {0}
+    
+    def metrics_text(self):
+        """Метрики браузера в текстовом формате Prometheus (запрос 'metrics' по IPC)"""
+        renderers = self.renderer_pids()
+        monitor = self.event_loop_monitor
+        manager = self.extension_manager
+        
+        samples = [
+            ('browser_tabs', 'gauge', self.tabs.count(), {}),
+            ('browser_renderer_processes', 'gauge', len(renderers), {}),
+            ('browser_event_loop_ticks_total', 'counter', monitor.ticks, {}),
+            ('browser_event_loop_stalls_total', 'counter', monitor.stalls, {}),
+            ('browser_event_loop_lag_seconds_total', 'counter', monitor.lag_total, {}),
+            ('browser_event_loop_lag_max_seconds', 'gauge', monitor.lag_max, {}),
+            ('browser_blocked_requests_total', 'counter', self.request_blocker.blocked, {}),
+            ('browser_filtered_requests_total', 'counter', self.request_blocker.checked, {}),
+            ('browser_request_filter_seconds_total', 'counter', self.request_blocker.match_seconds, {}),
+            ('browser_request_filter_max_seconds', 'gauge', self.request_blocker.match_max, {}),
+            ('browser_active_downloads', 'gauge', self.download_manager.active_count(), {}),
+        ]
+        
+        for pid in sorted(renderers):
+            stats = read_process_stats(pid)
+            if stats:
+                samples.append(('browser_renderer_rss_bytes', 'gauge', stats['rss_kb'] * 1024, {'pid': pid}))
+        
+        for name, process in manager.processes.items():
+            if process.state() != QProcess.Running:
+                continue
+            stats = read_process_stats(process.processId())
+            if stats:
+                samples.append(('extension_rss_bytes', 'gauge', stats['rss_kb'] * 1024, {'extension': name}))
+                samples.append(('extension_cpu_seconds_total', 'counter', stats['cpu_seconds'], {'extension': name}))
+            activation = manager.activations.get(name)
+            samples.append(('extension_frozen', 'gauge', int(bool(activation and activation.frozen)), {'extension': name}))
+        for name, latency in manager.activation_latency.items():
+            samples.append(('extension_activation_latency_seconds', 'gauge', latency, {'extension': name}))
+        for name, report in manager.suspension_stats.items():
+            samples.append(('extension_suspensions_total', 'counter', report['count'], {'extension': name}))
+        
+        return format_metrics(sorted(samples, key=lambda sample: sample[0]))
+    
     def show_server_monitor(self):
         """Показывает монитор сервера"""
         # Ищем запущенные Python процессы
@@ -751,9 +2750,9 @@ class Browser(QMainWindow):
     
     def add_new_tab(self, qurl=None, label="Новая вкладка"):
         if qurl is None:
-            qurl = QUrl("https://ya.ru")
+            qurl = QUrl(self.settings['home_page'])
             
-        browser = QWebEngineView()
+        browser = QWebEngineView(self.profile)
         browser.setUrl(qurl)
         
         i = self.tabs.addTab(browser, label)
@@ -763,10 +2762,24 @@ class Browser(QMainWindow):
         browser.urlChanged.connect(lambda qurl, browser=browser: 
             self.update_urlbar(qurl, browser))
             
+        # Запоминаем посещение для предсказания следующих переходов
+        browser.loadFinished.connect(lambda ok, browser=browser: ok and self.history.record(browser.url()))
+        
+        # Текст страницы уходит в полнотекстовый индекс
+        browser.loadFinished.connect(lambda ok, browser=browser: ok and self.page_indexer.page_loaded(browser))
+        
         # Обновляем заголовок вкладки при изменении заголовка страницы
         browser.loadFinished.connect(lambda _, i=i, browser=browser: 
             self.tabs.setTabText(i, browser.page().title()[:15] + "..." if browser.page().title() else "Новая вкладка"))
-    
+
+    def open_urls(self):
+        """Адреса открытых вкладок, включая запрошенные, но еще не загруженные"""
+        urls = []
+        for i in range(self.tabs.count()):
+            page = self.tabs.widget(i).page()
+            urls += [page.url().toString(), page.requestedUrl().toString()]
+        return urls
+
     def tab_double_click(self, i):
         if i == -1:  # Двойной клик на пустом пространстве
             self.add_new_tab()
@@ -809,7 +2822,7 @@ class Browser(QMainWindow):
     
     def navigate_home(self):
         """Переход на домашнюю страницу"""
-        self.tabs.currentWidget().setUrl(QUrl("https://ya.ru"))
+        self.tabs.currentWidget().setUrl(QUrl(self.settings['home_page']))
     
     def navigate_back(self):
         self.tabs.currentWidget().back()
@@ -832,6 +2845,7 @@ class Browser(QMainWindow):
         self.menu_expanded = not self.menu_expanded
 
 if __name__ == "__main__":
+    apply_process_settings(load_settings())
     app = QApplication(sys.argv)
     window = Browser()
     window.show()
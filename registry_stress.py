@@ -0,0 +1,96 @@
+"""Нагрузочная проверка ExtensionRegistry из нескольких процессов и потоков
+
+Каждый поток каждого процесса регистрирует свои расширения в общем
+registry.db (WAL, BEGIN IMMEDIATE), после чего проверяется, что ни одна
+запись не потерялась, и печатается пропускная способность в JSON. Время
+считается с момента, когда все процессы готовы, без их запуска:
+
+    python registry_stress.py --processes 4 --threads 4 --writes 200
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotePad'))
+
+import menager
+
+def write_worker(additions_path, process_index, threads, writes, ready):
+    """Процесс с несколькими потоками: у каждого потока свое соединение"""
+    registry = menager.ExtensionRegistry(additions_path)
+    ready.wait()
+
+    def run(thread_index):
+        for i in range(writes):
+            name = f"ext-{process_index}-{thread_index}-{i}"
+            registry.register(name, name + '/', {'name': name, 'version': str(i)})
+
+    workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def run_stress(additions_path, processes=4, threads=4, writes=30):
+    """Запускает запись и возвращает число ожидаемых и найденных строк"""
+    registry = menager.ExtensionRegistry(additions_path)
+    ready = multiprocessing.Barrier(processes + 1)
+    workers = [
+        multiprocessing.Process(target=write_worker, args=(additions_path, p, threads, writes, ready))
+        for p in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    ready.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    expected = processes * threads * writes
+    # Браузер читает список так же: соединением только для чтения
+    conn = sqlite3.connect(f"file:{registry.db_path}?mode=ro", uri=True)
+    try:
+        browser_rows = conn.execute("SELECT COUNT(*) FROM extensions").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'processes': processes,
+        'threads': threads,
+        'expected_rows': expected,
+        'rows': len(registry.query()),
+        'browser_rows': browser_rows,
+        'failed_processes': sum(1 for worker in workers if worker.exitcode != 0),
+        'seconds': round(elapsed, 3),
+        'writes_per_second': round(expected / elapsed, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельная запись в реестр расширений")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=200, help="записей на поток")
+    args = parser.parse_args()
+
+    results = []
+    # Один писатель для сравнения с параллельной записью того же объема
+    for processes, threads in ((1, 1), (args.processes, args.threads)):
+        work_dir = tempfile.mkdtemp(prefix='registry_stress_')
+        try:
+            writes = args.writes * args.processes * args.threads // (processes * threads)
+            results.append(run_stress(work_dir, processes, threads, writes))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0 if all(r['rows'] == r['expected_rows'] and not r['failed_processes'] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
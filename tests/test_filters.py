@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+# Без системных библиотек QtWebEngine main.py не импортируется
+main = pytest.importorskip('main', exc_type=ImportError)
+
+# Строки из EasyList и EasyPrivacy
+EASYLIST = """
+[Adblock Plus 2.0]
+! Title: EasyList
+||doubleclick.net^
+||googlesyndication.com^
+||x.com^$third-party
+|https://$script,third-party,domain=example.org
+|http://$image,third-party,domain=example.org
+||adnxs.com^$third-party
+/adserver/*
+-banner-ad-
+://ads.
+&ad_type=
+/^https?:\\/\\/[a-z]{8,15}\\.(com|net)\\//$script,third-party
+example.com##.ad-banner
+@@||doubleclick.net/ddm/$script,domain=allowed.example
+@@||cdn.jsdelivr.net^
+|https://
+||
+0.0.0.0 tracker.example
+""".splitlines()
+
+
+@pytest.fixture(scope='module')
+def rules():
+    return main.FilterRules.parse(EASYLIST)
+
+
+@pytest.mark.parametrize('host, url', [
+    ('stats.g.doubleclick.net', 'https://stats.g.doubleclick.net/r/collect'),
+    ('pagead2.googlesyndication.com', 'https://pagead2.googlesyndication.com/pagead/show_ads.js'),
+    ('site.org', 'https://site.org/adserver/banner.js'),
+    ('site.org', 'https://site.org/img/top-banner-ad-1.png'),
+    ('ads.site.org', 'https://ads.site.org/x.js'),
+    ('tracker.example', 'http://tracker.example/pixel.gif'),
+])
+def test_blocks_unconditional_rules(rules, host, url):
+    assert rules.matches(host, url)
+
+
+@pytest.mark.parametrize('host, url', [
+    # Правила с опциями ($third-party, $domain=...) пропускаются, а не применяются ко всем запросам
+    ('cdn.jsdelivr.net', 'https://cdn.jsdelivr.net/npm/vue@3/dist/vue.global.js'),
+    ('x.com', 'https://x.com/home'),
+    ('ib.adnxs.com', 'https://ib.adnxs.com/ut/v3'),
+    ('example.org', 'https://example.org/'),
+    ('example.org', 'http://example.org/logo.png'),
+    ('abcdefghij.com', 'https://abcdefghij.com/loader.js'),
+])
+def test_skips_rules_it_cannot_evaluate(rules, host, url):
+    assert not rules.matches(host, url)
+
+
+def test_scheme_and_anchor_only_patterns_are_dropped():
+    rules = main.FilterRules.parse(['|https://', '|http://', '||', '|', 'https://*'])
+    assert not rules.goto
+    assert not rules.matches('example.org', 'https://example.org/')
+
+
+def test_shared_wildcard_pieces_spread_over_states():
+    rules = main.FilterRules.parse([f"/ad{i}/*/pixel.gif" for i in range(50)])
+    # Общий кусок "/pixel.gif" не собирает все шаблоны в одном состоянии
+    assert max(len(ids) for ids in rules.partial.values()) == 1
+    assert rules.matches('cdn.example.com', 'https://cdn.example.com/ad7/x/pixel.gif')
+    assert not rules.matches('cdn.example.com', 'https://cdn.example.com/img/x/pixel.gif')
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import zipfile
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'NotePad'))
+
+import pytest
+import menager
+
+
+def make_archive(path, rules):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('rules.json', json.dumps(rules))
+        archive.writestr('index.html', '<html></html>')
+    return str(path)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    additions = tmp_path / 'additions'
+    additions.mkdir()
+    return menager.ExtensionManager(str(additions))
+
+
+@pytest.mark.parametrize('name', ['../victim', '..', '.trash', '/tmp/victim', 'a/../../victim', 'a\\b', ''])
+def test_extension_path_rejects_escaping_names(tmp_path, name):
+    with pytest.raises(ValueError):
+        menager.extension_path(str(tmp_path), name)
+
+
+def test_extension_path_rejects_symlink_outside(tmp_path):
+    (tmp_path / 'outside').mkdir()
+    additions = tmp_path / 'additions'
+    additions.mkdir()
+    os.symlink(tmp_path / 'outside', additions / 'link')
+    with pytest.raises(ValueError):
+        menager.extension_path(str(additions), 'link')
+
+
+def test_install_and_delete_do_not_touch_siblings(manager, tmp_path):
+    victim = tmp_path / 'victim'
+    victim.mkdir()
+    (victim / 'data.txt').write_text('keep')
+    archive = make_archive(tmp_path / 'evil.zip', {'name': '../victim', 'based_on': 'html', 'start': 'index.html'})
+
+    success, _ = manager.install_archive('../victim', archive)
+    assert not success
+    success, _ = manager.delete_extension('../victim')
+    assert not success
+    assert (victim / 'data.txt').read_text() == 'keep'
+    assert os.listdir(manager.trash.trash_path) == []
+
+
+def test_install_rejects_start_outside_extension(manager, tmp_path):
+    tool = tmp_path / 'tool'
+    tool.write_text('#!/bin/sh\n')
+    tool.chmod(0o644)
+    archive = make_archive(tmp_path / 'exe.zip', {'name': 'Tool', 'based_on': 'exe', 'start': '../../tool'})
+
+    success, _ = manager.install_archive('Tool', archive)
+    assert not success
+    assert tool.stat().st_mode & 0o777 == 0o644
+    assert not os.path.exists(os.path.join(manager.additions_path, 'Tool'))
+    assert manager.registry.get('Tool') is None
+
+
+def test_install_and_delete_regular_name(manager, tmp_path):
+    archive = make_archive(tmp_path / 'ok.zip', {'name': 'Notes', 'based_on': 'html', 'start': 'index.html'})
+
+    success, message = manager.install_archive('Notes', archive)
+    assert success, message
+    assert os.path.isfile(os.path.join(manager.additions_path, 'Notes', 'index.html'))
+
+    success, message = manager.delete_extension('Notes')
+    assert success, message
+    assert not os.path.exists(os.path.join(manager.additions_path, 'Notes'))
+
+
+def test_metrics_survive_unknown_routes(manager):
+    manager.start_server(port=0)
+    try:
+        base = f"http://localhost:{manager.server.server_address[1]}"
+        assert requests.get(f"{base}/api/bogus").status_code == 404
+        requests.get(f"{base}/api/extensions")
+
+        for _ in range(2):
+            response = requests.get(f"{base}/api/metrics")
+            assert response.status_code == 200
+        text = response.text
+        assert 'manager_http_requests_total{code="404",route="other"} 1' in text
+        assert '# TYPE manager_archive_cache_hits_total counter' in text
+        assert '# TYPE manager_archive_cache_entries gauge' in text
+    finally:
+        manager.stop_server()
+
+
+def test_metrics_labels_of_mixed_types_render():
+    metrics = menager.Metrics()
+    metrics.inc('requests_total', code=200)
+    metrics.inc('requests_total', code='none')
+    assert 'requests_total{code="none"} 1' in metrics.render()
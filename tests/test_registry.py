@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import registry_stress
+
+
+def test_parallel_register_keeps_every_row(tmp_path):
+    result = registry_stress.run_stress(str(tmp_path), processes=4, threads=4, writes=30)
+    assert result['failed_processes'] == 0
+    assert result['rows'] == result['expected_rows'] == 480
+    assert result['browser_rows'] == 480